@@ -0,0 +1,331 @@
+"""Benchmarks for Igrik's World.
+
+Runs World.step() and Renderer.render() over every shipped level and over
+synthetic stress scenes, with the renderer drawing onto StubCanvas, an
+in-memory stand-in for the Tk canvas, so no display is needed. For each
+scene it reports:
+
+* simulation steps per second and rendered frames per second;
+* canvas items created per frame and the most items alive at once;
+* tracemalloc figures from a second, traced run of the same scene: peak
+  traced memory and memory blocks still allocated at the end.
+
+Frame times include the renderer's idle work (background strip rasterizing
+with --strips), which StubCanvas runs after every frame.
+
+Results are written as JSON (bench_output.json by default). Pass a previous
+result file with --compare to print how each scene's rates changed:
+
+    python bench.py --out new.json --compare old.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import tracemalloc
+from time import perf_counter
+
+from world import World, Inputs, Level, make_level, SIM_DT, SIM_HZ, TILE_SIZE, MAP_H, SOLID
+from levels import levels
+
+STEPS = 2400                   # simulation steps per scene (20 s of play)
+STEPS_PER_FRAME = 2            # SIM_HZ / igriksworld.FPS
+
+# --- HEADLESS CANVAS ---
+# Implements the part of the Tk canvas item API the renderer uses. Items
+# are kept only as tag sets so creation, deletion and tag lookups cost
+# about what bookkeeping costs, not drawing.
+class StubCanvas:
+    def __init__(self):
+        self.items = {}           # item id -> tags
+        self.tagged = {}          # tag -> item ids
+        self.next_id = 1
+        self.created = 0
+        self.calls = 0
+        self.max_items = 0
+        self.idle = []            # after_idle callbacks not run yet
+
+    def create(self, *args, tags=(), **options):
+        self.calls += 1
+        self.created += 1
+        item = self.next_id
+        self.next_id += 1
+        if isinstance(tags, str):
+            tags = (tags,)
+        self.items[item] = tags
+        for tag in tags:
+            self.tagged.setdefault(tag, set()).add(item)
+        if len(self.items) > self.max_items:
+            self.max_items = len(self.items)
+        return item
+
+    create_rectangle = create_oval = create_polygon = create_text = create_line = create_image = create
+
+    def find(self, tag_or_id):
+        if isinstance(tag_or_id, int):
+            return (tag_or_id,) if tag_or_id in self.items else ()
+        if tag_or_id == 'all':
+            return tuple(self.items)
+        return tuple(self.tagged.get(tag_or_id, ()))
+
+    def delete(self, *tags_or_ids):
+        self.calls += 1
+        for t in tags_or_ids:
+            for item in self.find(t):
+                for tag in self.items.pop(item):
+                    self.tagged[tag].discard(item)
+
+    def move(self, tag_or_id, dx, dy):
+        self.calls += 1
+
+    def coords(self, tag_or_id, *args):
+        self.calls += 1
+
+    def itemconfigure(self, tag_or_id, **options):
+        self.calls += 1
+
+    itemconfig = itemconfigure
+
+    def tag_raise(self, tag_or_id, above=None):
+        self.calls += 1
+
+    def tag_lower(self, tag_or_id, below=None):
+        self.calls += 1
+
+    def configure(self, **options):
+        self.calls += 1
+
+    def after_idle(self, func):
+        self.idle.append(func)
+        return len(self.idle)
+
+    # runs the idle callbacks queued so far, as Tk does between frames
+    def run_idle(self):
+        idle, self.idle = self.idle, []
+        for func in idle:
+            func()
+
+# Stands in for PhotoImage when measuring rasterized background strips.
+class StubImage:
+    def __init__(self, width, height):
+        self.size = (width, height)
+        self.puts = 0
+
+    def put(self, data, to=None):
+        self.puts += 1
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+# --- SCENES ---
+# A scene returns a World ready to run and an inputs(step, world) callback
+# that sets up the Inputs for that step.
+def walker(inputs):
+    lives = [None, None, 0]       # lives and level last seen, steps left to wait
+    def drive(i, world):
+        # after a respawn the player stands inside the start tile for a moment
+        seen = (world.player.lives, world.current_level_index)
+        if seen != tuple(lives[:2]):
+            lives[:2] = seen
+            lives[2] = 30
+        if lives[2] > 0:
+            lives[2] -= 1
+            inputs.left = inputs.right = False
+        else:
+            inputs.right = (i // 400) % 6 != 5
+            inputs.left = not inputs.right
+        if i % 45 == 0:
+            inputs.jump_pressed = inputs.jump_held = True
+        if i % 45 == 35:
+            inputs.jump_held = False
+        if i % 37 == 0:
+            inputs.shoot = True
+    return drive
+
+def level_scene(index):
+    def scene():
+        world = World(levels)
+        world.new_game(index)
+        return world, walker
+    return scene
+
+# row of the first solid tile from the top of column c, or None
+def ground_row(world, c):
+    for r in range(world.map_h):
+        if world.kind_at(c, r) == SOLID:
+            return r
+    return None
+
+def projectile_scene(count):
+    def scene():
+        world = World(levels)
+        world.new_game(0)
+        world.projectiles.resize(count)
+        rng = random.Random(1)
+        lives = world.player.lives
+        def fill(i, world):
+            # shots that hit the player still cost a respawn, but never the
+            # game, so the scene runs every step
+            world.player.lives = lives
+            # top the load back up, in view, as shots hit tiles or leave it
+            while len(world.projectiles) < count:
+                x = world.camera_x + rng.uniform(0, world.view_w)
+                world.spawn_fireball(x, rng.uniform(0, 300), rng.choice((-260, 260)))
+        def drive_factory(inputs):
+            return fill
+        return world, drive_factory
+    return scene
+
+def enemy_scene(count):
+    def scene():
+        world = World(levels)
+        world.new_game(0)
+        rng = random.Random(2)
+        while len(world.enemies) < count:
+            c = rng.randrange(10, world.map_w)
+            r = ground_row(world, c)
+            if r:
+                world.spawn_enemy(c * TILE_SIZE + TILE_SIZE / 2, r * TILE_SIZE - 15.001, rng.choice((-60.0, 60.0)))
+        return world, walker
+    return scene
+
+# a long flat run with a platform pattern, so the camera scrolls the whole
+# time and new tile columns enter the view every few frames; with enemies,
+# that many walk the floor along the whole level, most of them asleep, and
+# those the view has left behind are retired as in the game
+def wide_scene(width, enemies=0):
+    def scene():
+        rows = [' ' * width for _ in range(MAP_H)]
+        rows[MAP_H - 1] = '#' * width
+        rows[MAP_H - 5] = ''.join('g' if c % 12 < 4 else ' ' for c in range(width))
+        rows[MAP_H - 2] = ' s' + ' ' * (width - 2)
+        world = World([Level.from_rows(make_level(rows), 'skyblue', False)])
+        world.new_game()
+        for k in range(enemies):
+            c = 40 + k * (width - 40) // enemies
+            world.spawn_enemy(c * TILE_SIZE + TILE_SIZE / 2, (MAP_H - 1) * TILE_SIZE - 15.001)
+        def drive_factory(inputs):
+            def drive(i, world):
+                inputs.right = i >= 30
+            return drive
+        return world, drive_factory
+    return scene
+
+def scenes():
+    found = {f'level-{i + 1:02d}': level_scene(i) for i in range(len(levels))}
+    found['projectiles-5000'] = projectile_scene(5000)
+    found['enemies-300'] = enemy_scene(300)
+    found['wide-scroll-20000'] = wide_scene(20000)
+    found['wide-enemies-1000'] = wide_scene(20000, 1000)
+    return found
+
+# --- RUNNER ---
+def run_scene(scene, steps, render, strips=False):
+    world, drive_factory = scene()
+    inputs = Inputs()
+    drive = drive_factory(inputs)
+    canvas = StubCanvas()
+    if render:
+        # the frontend imports tkinter; only load it when rendering is measured
+        from igriksworld import Renderer
+        renderer = Renderer(canvas, world, StubImage if strips else None)
+        renderer.build_level()
+    level_index = world.current_level_index
+    step_time = render_time = 0.0
+    frames = steps_run = 0
+    created_before = canvas.created
+    for i in range(steps):
+        if world.state != "game":
+            break
+        drive(i, world)
+        t = perf_counter()
+        world.step(SIM_DT, inputs)
+        step_time += perf_counter() - t
+        steps_run += 1
+        if render and steps_run % STEPS_PER_FRAME == 0:
+            t = perf_counter()
+            if world.current_level_index != level_index:
+                level_index = world.current_level_index
+                renderer.build_level()
+            renderer.render(0.5)
+            canvas.run_idle()
+            render_time += perf_counter() - t
+            frames += 1
+    return {
+        'steps': steps_run,
+        # the state that ended the scene early ('over' or 'won'), or None
+        'ended_early': world.state if steps_run < steps else None,
+        'steps_per_sec': steps_run / step_time if step_time else 0.0,
+        'frames': frames,
+        'frames_per_sec': frames / render_time if render_time else 0.0,
+        'items_created_per_frame': (canvas.created - created_before) / frames if frames else 0.0,
+        'canvas_calls_per_frame': canvas.calls / frames if frames else 0.0,
+        'max_items': canvas.max_items,
+    }
+
+def trace_scene(scene, steps, render, strips=False):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run_scene(scene, steps, render, strips)
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    return {'alloc_peak_kib': peak / 1024, 'alloc_blocks': blocks}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, old):
+    for name, r in results.items():
+        o = old.get(name)
+        if not o:
+            continue
+        changes = []
+        for key in ('steps_per_sec', 'frames_per_sec'):
+            if o.get(key):
+                changes.append(f"{key} {r[key] / o[key] - 1:+.1%}")
+        print(f"{name:20s} " + "  ".join(changes))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark World.step() and Renderer.render()")
+    parser.add_argument('--steps', type=int, default=STEPS, help="simulation steps per scene")
+    parser.add_argument('--only', metavar='PREFIX', help="run only scenes whose name starts with PREFIX")
+    parser.add_argument('--no-render', action='store_true', help="measure the simulation only")
+    parser.add_argument('--no-trace', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--strips', action='store_true', help="draw tiles from rasterized background strips")
+    parser.add_argument('--out', default='bench_output.json', help="where to write the JSON results")
+    parser.add_argument('--compare', metavar='JSON', help="earlier results to compare against")
+    args = parser.parse_args(argv)
+    render = not args.no_render
+
+    results = {}
+    for name, scene in scenes().items():
+        if args.only and not name.startswith(args.only):
+            continue
+        r = run_scene(scene, args.steps, render, args.strips)
+        if not args.no_trace:
+            r.update(trace_scene(scene, args.steps, render, args.strips))
+        results[name] = r
+        ended = f"  ENDED EARLY ({r['ended_early']}) after {r['steps']} steps" if r['ended_early'] else ""
+        print(f"{name:20s} {r['steps_per_sec']:9.0f} steps/s {r['frames_per_sec']:9.0f} frames/s "
+              f"{r['items_created_per_frame']:7.2f} items/frame{ended}", flush=True)
+
+    with open(args.out, 'w') as f:
+        json.dump({'commit': git_commit(), 'python': platform.python_version(),
+                   'machine': platform.machine(), 'sim_hz': SIM_HZ, 'steps': args.steps,
+                   'scenes': results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['scenes'])
+
+if __name__ == '__main__':
+    main()
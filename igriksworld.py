@@ -1,27 +1,50 @@
 
 
+import argparse
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import *
 from time import time
-from math import floor
 
-# --- CONFIG ---
-WIDTH, HEIGHT = 1000, 1000
-FPS = 60
-
-TILE_SIZE = 40
-MAP_W, MAP_H = 256, 14
-VIEW_W, VIEW_H = WIDTH, HEIGHT
+from world import World, Inputs, WIDTH, HEIGHT, TILE_SIZE, SIM_DT
+from levels import levels
+from levelgen import GeneratedLevel
+from profiler import FrameProfiler, PHASES
+from replay import InputRecorder, session_path
+from rewind import RewindBuffer
+import snapshot
 
-# physics
-GRAVITY = 1600.0
-MAX_FALL = 1500.0
-WALK_ACCEL = 3600.0
-MAX_RUN = 330.0
-FRICTION = 3800.0
-JUMP_SPEED = 900
-JUMP_CUTOFF = 0.45
+# --- CONFIG ---
+FPS = 60                 # render rate; the simulation runs at world.SIM_HZ
+MAX_FRAME_DT = 0.1       # longest frame the simulation catches up on
+OVERLAY_EVERY = 15       # frames between profiler overlay refreshes
+PROFILE_TRACE = 'frame_profile'   # F4 writes <name>.csv and <name>.json
+STRIP_COLS = WIDTH // TILE_SIZE   # tile columns per rasterized background strip
+RASTER_COLS = 4          # columns rasterized per idle callback
+CULL_MARGIN = 2 * TILE_SIZE   # actors this far outside the view are still drawn
+STRIP_CACHE = 12         # strips (1000x560 px, about 2.2 MB each) kept for levels the player comes back to
+QUICKSAVE_NAME = 'quicksave.igs'  # F5 saves the game here, F9 loads it
+AUTOSAVE_NAME = 'autosave.igs'    # kept while a game runs, offered as Resume after a crash
+AUTOSAVE_EVERY = 10      # seconds between autosaves, besides one at each level start
+MESSAGE_SECONDS = 4      # how long a message (a failed save, ...) stays in the HUD
+REWIND_KEY = 'r'         # held, steps the game back in time
+
+# saves go in the per-user data directory of the platform, not wherever the
+# game was started from
+def user_data_dir():
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(base, 'igriksworld')
 
-LIVES_START = 20
+SAVE_DIR = user_data_dir()
+QUICKSAVE_PATH = os.path.join(SAVE_DIR, QUICKSAVE_NAME)
+AUTOSAVE_PATH = os.path.join(SAVE_DIR, AUTOSAVE_NAME)
 
 # tile colors (keeps original tile letters)
 TILE_COLORS = {
@@ -40,541 +63,667 @@ TILE_COLORS = {
     'c': 'cyan',
     'x': 'lightblue',
     't': 'grey',
+    'e': None,          # enemy spawn marker
     ' ': None
 }
 
-# --- helper to make levels consistent width/height ---
-def make_level(rows):
-    new = []
-    for r in rows:
-        if len(r) > MAP_W:
-            r = r[:MAP_W]
-        new.append(r + ' ' * (MAP_W - len(r)))
-    while len(new) < MAP_H:
-        new.insert(0, ' ' * MAP_W)
-    if len(new) > MAP_H:
-        new = new[-MAP_H:]
-    return new
-
-# --- ORIGINAL 12 LEVELS (preserved) ---
-levels = []
-
-# Level 1
-levels.append([
-    make_level([
-        "                                  ",
-        "                                  ",
-        "                                  ",
-        "                      gg          ",
-        "                    gggggg         ",
-        "                   gggggggg       ",
-        "                       q          ",
-        "s                      q                             g     f",
-        "ggggggggg  gggggg gggggggggggggggg    g  ggg   g     q     q",
-        "qqqqqqqqq  qqqqqq qqqqqqqqqqqqqqqq    q  qqq   q     q     q"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 2
-levels.append([
-    make_level([
-        "                                 ",
-        "                                 ",
-        "                                                                            ",
-        "                            gggg                                      ggg    ",
-        "                          gggggggg                                  gggggg   ",
-        "                            w                                         b     ",
-        "                            b                                         w     ",
-        "                            w                  ggg                    b              ",
-        "sggggggg    g      gggggggggggggggggggg        qqq         ggg       ggg        ggggf",
-        "qqqqqqqq    q      qqqqqqqqqqqqqqqqqqqq        qqq         qqq       qqq        qqqqq"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 3
-levels.append([
-    make_level([
-        "                               ",
-        "                                ",
-        "                                 ",
-        "                                                                 gg ",
-        "                     gggg                                      ggggg ",
-        "                   ggggggg                                       b  ",
-        "                     qqq                                         w   ",
-        "                     qqq                             ggg    gggggggg     ggf",
-        "sgggggggg   ggggggggggggggggggggg     ggg    gggg    qqq    qqqqqqqq     qqq",
-        "qqqqqqqqq   qqqqqqqqqqqqqqqqqqqqq     qqq    qqqq    qqq    qqqqqqqq     qqq"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 4
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                ",
-        "                                ",
-        "                          gg    ",
-        "                        ggggg    ",
-        "                          q     ",
-        "                          q                       ggg   ggggf",
-        "ggggggggg   g    ggggggggggggggggg   ggggg   g    qqq   qqqqq",
-        "qqqqqqqqq   q    qqqqqqqqqqqqqqqqq   qqqqq   q    qqq   qqqqq"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 5
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                                                         ggg",
-        "                          ggg                                          gggggg",
-        "                        gggggg                                           w",
-        "                          b                                              b ",
-        "                          w                                              w",
-        "                          b                       ggggg   ggggg  gggggggggggggggggg   ggggf",
-        "ggggggggg   g    ggggggggggggggggg   ggggg   gg   qqqqq   qqqqq  qqqqqqqqqqqqqqqqqq   qqqqq",
-        "qqqqqqqqq   q    qqqqqqqqqqqqqqqqq   qqqqq   qq   qqqqq   qqqqq  qqqqqqqqqqqqqqqqqq   qqqqq"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 6
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                                ",
-        "                                      ggg       ",
-        "                   ggg        gg    gggggg   gg",
-        "                  ggggg     ggggg     b    ggggg  ",
-        "                    q         q       w      q   ",
-        "                    q         q       b      q   ",
-        "sggggggggg  ggggggggggggg    ggg     ggg    ggg     ggggf     ",
-        "qqqqqqqqqq  qqqqqqqqqqqqq    qqq     qqq    qqq     qqqqq      "
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 7
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                                                      ",
-        "                                                                       ggg",
-        "                           gg                     gg                 ggggggg                      ",
-        "                         ggggg                  ggggg                   w                          ",
-        "                           q                      w                     b                         ",
-        "                           q                      b                     w                         ",
-        "gggggggggg    ggggg   gggggggggg    ggggg   gggggggggg    ggggg   gggggggggg    ggggg   gggggggggf",
-        "qqqqqqqqqq    qqqqq   qqqqqqqqqq    qqqqq   qqqqqqqqqq    qqqqq   qqqqqqqqqq    qqqqq   qqqqqqqqqq"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 8
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                ",
-        "                          ggg   ",
-        "                         ggggg   ",
-        "                           w    ",
-        "                           b    ",
-        "                           w    ",
-        "    sggggggggggggggggggggggggggf",
-        "    qqqqqqqqqqqqqqqqqqqqqqqqqqqq"
-    ]),
-    "lightblue",
-    True
-])
-
-# Level 9, New World! Castle.
-levels.append([
-    make_level([
-        "                                         brrrr          ",
-        "                                         brrrr          ",
-        "                                         b              ",
-        "                               t t t t t bt t t t t t t",
-        "                               tttttttttttttttttttttttttttttt      ",
-        "                      t t t    t                       t    t ",
-        "                      ttttt                                 t  ",
-        "                      ttttt                                 t  ",
-        "sttttttttt   ttttttttttttttttttttttttttt   tttt    ttttttttft",
-        "tttttttttt   ttttttttttttttttttttttttttt   tttt    tttttttttt"
-    ]),
-    "lightskyblue",
-    False
-])
-
-# Level 10
-levels.append([
-    make_level([
-        "                                              ",
-        "                                               ",
-        "                      brrr                      ",
-        "                      brrr                      ",
-        "                      b                         ",
-        "            ttttttttttttttttttttt                       ",
-        "            t                   t                        ",
-        "                                t                        ",
-        "sgggggggggggtttttttttttttttttttotgggggggggggggg   ggg     g      gggg   ggggf",
-        "qqqqqqqqqqqqtttttttttttttttttttttqqqqqqqqqqqqqq   qqq     q      qqqq   qqqqq"
-    ]),
-    "skyblue",
-    False
-])
-
-# Level 11
-levels.append([
-    make_level([
-        "                                              ",
-        "                                               ",
-        "                      brrr                      ",
-        "                      brrr                      ",
-        "                      b                         ",
-        "            ttttttttttttttttttttt                       ",
-        "            t                   t                        ",
-        "                                t                        ",
-        "sgggggggggggtttttttttttttttttttftgggggggggggggg   ggg     g      gggg   ggggo",
-        "qqqqqqqqqqqqtttttttttttttttttttttqqqqqqqqqqqqqq   qqq     q      qqqq   qqqqq"    ]),
-    "skyblue",
-    False
-])
-
-# Level 12: Boss 
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                ",
-        "                                ",
-        "                                ",
-        "                         t t t  ",
-        "                         ttttt  ",
-        "                         ttttt  ",
-        "   sttttttttttttttttttttttttttttttttf",
-        "   tttttttttttttttttttttttttttttttttt"
-    ]),
-    "lightblue",
-    True   
-])
-# Level 13: Snowy Forest 
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                ",
-        "                               ",
-        "                          w     ",
-        "                         www    ",
-        "                        wwwww   ",
-        "                          q     ",
-        "swwwwwwww   ww   wwwwwwwwwwwwwwww    w    ww     www  wwf",
-        "qqqqqqqqq   qq   qqqqqqqqqqqqqqqq    q    qq     qqq  qqq"
-    ]),
-    "lightblue",
-    False   
-])
-#Level 14
-levels.append([
-    make_level([
-        "                                        ",
-        "                                        ",
-        "                                        ",
-        "                                        ",
-        "                              w                                                                        f    ",
-        "                             www                                                                      www  ",
-        "                            wwwww                                                                    wwwww ",
-        "                              q                                                                        q   ",
-        "swwwwwwww    www     wwwwwwwwwwwwwwww   wwww   wwwwwww   wwww   wwwwwww   wwww   wwwwwww   wwwwwwwwwwwwww  ",
-        "qqqqqqqqq    qqq     qqqqqqqqqqqqqqqq   qqqq   qqqqqqq   qqqq   qqqqqqq   qqqq   qqqqqqq   qqqqqqqqqqqqqq"
-    ]),
-    "lightblue",
-    False   
-])
-levels.append([
-    make_level([
-        "                                        ",
-        "                                        ",
-        "                                        ",
-        "                                        ",
-        "                              w                                                                        w    ",
-        "                             www                                                                      www  ",
-        "                            wwwww                                                                    wwwww ",
-        "                              q                                                                        q   ",
-        "swwwwwwww    www     wwwwwwwwwwwwwwww   wwww   wwwwwww   wwww   wwwwwww   wwww   wwwwwww   wwwwwwwwwwwwwwwwwwwwwwwwww    wwwwww   www    wwwwf",
-        "qqqqqqqqq    qqq     qqqqqqqqqqqqqqqq   qqqq   qqqqqqq   qqqq   qqqqqqq   qqqq   qqqqqqq   qqqqqqqqqqqqqqqqqqqqqqqqqq    qqqqqq   qqq    qqqqq"
-    ]),
-    "lightblue",
-    False   
-])
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                ",
-        "                                ",
-        "                          w     ",
-        "                         www    ",
-        "                        wwwww    ",
-        "                          q          ",
-        "   swwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwf",
-        "   qqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqq"
-    ]),
-    "lightblue",
-    True   
-])
-levels.append([
-    make_level([
-        "                                                ",
-        "                                                ",
-        "                                                ",
-        "                                                ",
-        "                                                         t ",
-        "                                                        ttt         ",
-        "             tt                                          t           ",
-        "             tt     o                      o             t           ",
-        "sgggggggggggggggggggggggggg   gg     g  gggggg   gggg  gggggg   gggggf",
-        "qqqqqqqqqqqqqqqqqqqqqqqqqqq   qq     q  qqqqqq   qqqq  qqqqqq   qqqqqq"
-    ]),
-    "black",
-    False   
-])
-levels.append([
-    make_level([
-        "                                ",
-        "                                ",
-        "                                ",
-        "                                ",
-        "                             t  ",
-        "                            ttt ",
-        "                             t  ",
-        "                             t       ",
-        "   sggggggggggggggggggggggggggggggggggggggf",
-        "   qqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqq"
-    ]),
-    "black",
-    True   
-])
-levels.append([
-    make_level([
-        "                                ",
-        "     wwwww    w  w    wwwww  w   w  w w    w w   wwwww  w   w           w  wwwww  wwww  w  w w  w ",
-        "       w      w  w    w   w  ww  w  ww      w    w   w  w   w           w  w      w  w  w  ww   w ",
-        "       w      wwww    wwwww  w w w  w w     w    w   w  w   w           w  w  ww  www   w  ww      ",
-        "       w      w  w    w   w  w  ww  w  w    w    wwwww  wwwww   w       w  wwwww  w  w  w  w w  w ",
-        "                                                                w                                  ",
-        "                                                                                                    ",
-        "                                                                                                    ",
-        "swwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwww",
-        "wwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwwww"
-    ]),
-    "skyblue",
-    False   
-])
-
+# --- RENDERER ---
+# Draws a World onto a Tk canvas (or anything with the same item API).
+#
+# Tile items are created once when their column scrolls into view and are then
+# only moved as the camera scrolls; columns leaving the view are deleted.
+# Every drawn actor owns its canvas items for its lifetime: they are created
+# the first time the actor is drawn, moved with one canvas.move when its screen
+# position changes, and deleted once the actor is gone from its list or more
+# than CULL_MARGIN outside the view; an actor coming back into view is drawn
+# afresh. Enemies are found through their home chunks, so drawing costs what
+# is on screen, not what is in the level. Items tagged "hud" are raised back
+# above anything it creates.
+#
+# Given an image_type (Tk's PhotoImage), the tiles are also rasterized into
+# one image per STRIP_COLS columns, a few columns per idle callback so a level
+# change never waits for it. Once a strip is ready its columns are drawn by a
+# single image item instead of one rectangle per tile; until then they keep
+# their rectangles. Strips are cached by level key across level loads, and
+# preload() rasterizes the first ones of a level before it is loaded.
+class Renderer:
+    def __init__(self, canvas, world, image_type=None):
+        self.canvas = canvas
+        self.world = world
+        self.tile_items = {}          # column -> canvas item ids of that column
+        self.tile_cam_x = 0.0         # camera x the existing tile items are positioned for
+        self.tile_first_col = 0
+        self.tile_last_col = -1
+        self.sprite_seq = 0
+        self.drawn_sprites = {}       # sprite tag drawn in the last frame -> its actor (None for shots)
+        self.shot_pos = {}            # projectile sprite tag -> screen position
+        self.image_type = image_type
+        self.level_key = None
+        self.strips = OrderedDict()   # (level key, strip) -> image, most recent last
+        self.strip_items = {}         # strip -> (canvas item, image) in view
+        self.raster_queue = []        # (level key, strip) waiting to be rasterized
+        self.raster_job = None        # [level key, grid, strip, image, next column] being rasterized
+        self.preload_target = None    # (level key, grid) of the level preloaded next
+        self.raster_id = None         # pending after_idle callback
+
+    # --- RETAINED TILE LAYER ---
+    def visible_columns(self, cam_x):
+        first_col = max(0, int(cam_x // TILE_SIZE))
+        last_col = min(self.world.map_w - 1, int((cam_x + WIDTH) // TILE_SIZE) + 1)
+        return first_col, last_col
+
+    def create_tile_column(self, c):
+        canvas = self.canvas
+        map_h = self.world.map_h
+        column = self.world.grid.column_tiles(c)
+        strip = c // STRIP_COLS
+        image = self.strip_image(strip)
+        if image is not None and strip not in self.strip_items:
+            self.show_strip(strip, image)
+        ids = []
+        x1 = c * TILE_SIZE - self.tile_cam_x
+        x2 = x1 + TILE_SIZE
+        for r in range(map_h):
+            ch = chr(column[r])
+            color = TILE_COLORS.get(ch, 'grey')
+            if color:
+                y1 = r * TILE_SIZE
+                if image is None:
+                    ids.append(canvas.create_rectangle(x1, y1, x2, y1 + TILE_SIZE, fill=color, outline="black", tags="tiles"))
+                # draw flag for finish
+                if ch == 'f':
+                    ids.append(canvas.create_text(x1 + TILE_SIZE/2, y1 + TILE_SIZE/2, text="🏁", font=("Helvetica", 18), tags="tiles"))
+        self.tile_items[c] = ids
+
+    def delete_tile_column(self, c):
+        for item in self.tile_items.pop(c, ()):
+            self.canvas.delete(item)
+
+    # (re)create background, tiles and sprites for the world's current level
+    def build_level(self):
+        canvas = self.canvas
+        canvas.delete("tiles")
+        canvas.delete("bg")
+        self.tile_items.clear()
+        self.strip_items.clear()
+        # a strip half done for another level is dropped
+        level = self.world.level
+        self.level_key = getattr(level, 'key', level)
+        self.raster_queue.clear()
+        self.raster_job = None
+        self.preload_target = None
+        self.reset_sprites()
+        canvas.create_rectangle(0, 0, WIDTH, HEIGHT, fill=self.world.level_bg, width=0, tags="bg")
+        canvas.tag_lower("bg")
+        self.tile_cam_x = self.world.camera_x
+        self.tile_first_col, self.tile_last_col = self.visible_columns(self.tile_cam_x)
+        for c in range(self.tile_first_col, self.tile_last_col + 1):
+            self.create_tile_column(c)
+        self.strip_image(self.tile_last_col // STRIP_COLS + 1)
+
+    def scroll_tile_layer(self, cam_x):
+        if cam_x == self.tile_cam_x:
+            return
+        self.canvas.move("tiles", self.tile_cam_x - cam_x, 0)
+        self.tile_cam_x = cam_x
+        first_col, last_col = self.visible_columns(cam_x)
+        if first_col == self.tile_first_col and last_col == self.tile_last_col:
+            return
+        # drop columns that left the view, create the ones that entered it
+        for c in range(self.tile_first_col, self.tile_last_col + 1):
+            if c < first_col or c > last_col:
+                self.delete_tile_column(c)
+        for strip in [s for s in self.strip_items if not first_col // STRIP_COLS <= s <= last_col // STRIP_COLS]:
+            self.canvas.delete(self.strip_items.pop(strip)[0])
+        for c in range(first_col, last_col + 1):
+            if c < self.tile_first_col or c > self.tile_last_col:
+                self.create_tile_column(c)
+        self.tile_first_col, self.tile_last_col = first_col, last_col
+        # get the strips on either side of the view ready before they are needed
+        self.strip_image(first_col // STRIP_COLS - 1)
+        self.strip_image(last_col // STRIP_COLS + 1)
+        # new columns were stacked on top; keep actors and HUD above the tiles
+        self.canvas.tag_raise("sprite")
+        self.canvas.tag_raise("hud")
+
+    # --- BACKGROUND STRIPS ---
+    # the rasterized image of a strip of this level, or None (and the strip
+    # is queued) if it isn't ready yet
+    def strip_image(self, strip):
+        if self.image_type is None or strip < 0 or strip * STRIP_COLS >= self.world.map_w:
+            return None
+        key = (self.level_key, strip)
+        image = self.strips.get(key)
+        if image is not None:
+            self.strips.move_to_end(key)
+            return image
+        self.queue_strip(self.level_key, strip)
+        return None
+
+    def queue_strip(self, key, strip):
+        job = self.raster_job
+        if (key, strip) not in self.raster_queue and not (job and job[0] == key and job[2] == strip):
+            self.raster_queue.append((key, strip))
+            if self.raster_id is None:
+                self.raster_id = self.canvas.after_idle(self.raster_step)
+
+    # rasterizes, in idle time, the strips the first view of a level that
+    # isn't loaded yet will show, so they are cached once it is
+    def preload(self, level, grid, camera_x):
+        if self.image_type is None:
+            return
+        key = getattr(level, 'key', level)
+        self.preload_target = (key, grid)
+        first, last = camera_x // TILE_SIZE // STRIP_COLS, (camera_x + WIDTH) // TILE_SIZE // STRIP_COLS
+        for strip in range(int(first), min(int(last), (grid.w - 1) // STRIP_COLS) + 1):
+            if (key, strip) not in self.strips:
+                self.queue_strip(key, strip)
+
+    def show_strip(self, strip, image):
+        x = strip * STRIP_COLS * TILE_SIZE - self.tile_cam_x
+        item = self.canvas.create_image(x, 0, image=image, anchor=NW, tags="tiles")
+        self.canvas.tag_raise(item, "bg")
+        # the item only keeps Tk's image alive while Python holds a reference
+        self.strip_items[strip] = (item, image)
+
+    # rasterizes the next RASTER_COLS columns of the queued strips
+    def raster_step(self):
+        self.raster_id = None
+        first, last = self.tile_first_col // STRIP_COLS, self.tile_last_col // STRIP_COLS
+        while self.raster_job is None and self.raster_queue:
+            key, strip = self.raster_queue.pop(0)
+            if (key, strip) in self.strips:
+                continue
+            if key == self.level_key:
+                # the camera may have moved on since the strip was queued
+                if not first - 1 <= strip <= last + 1:
+                    continue
+                grid = self.world.grid
+            elif self.preload_target and key == self.preload_target[0]:
+                grid = self.preload_target[1]
+            else:
+                continue
+            image = self.image_type(width=STRIP_COLS * TILE_SIZE, height=grid.h * TILE_SIZE)
+            self.raster_job = [key, grid, strip, image, strip * STRIP_COLS]
+        if self.raster_job is None:
+            return
+        key, grid, strip, image, c = self.raster_job
+        end = min(c + RASTER_COLS, (strip + 1) * STRIP_COLS, grid.w)
+        width, height = image.width(), image.height()
+        for col in range(c, end):
+            column = grid.column_tiles(col)
+            x = (col - strip * STRIP_COLS) * TILE_SIZE
+            for r in range(grid.h):
+                color = TILE_COLORS.get(chr(column[r]), 'grey')
+                if color:
+                    # a canvas rectangle's outline covers both its edges
+                    y = r * TILE_SIZE
+                    image.put("black", to=(x, y, min(x + TILE_SIZE + 1, width), min(y + TILE_SIZE + 1, height)))
+                    image.put(color, to=(x + 1, y + 1, x + TILE_SIZE, y + TILE_SIZE))
+        self.raster_job[4] = end
+        if end == min((strip + 1) * STRIP_COLS, grid.w):
+            self.raster_job = None
+            self.strip_done(key, strip, image)
+        if self.raster_job or self.raster_queue:
+            self.raster_id = self.canvas.after_idle(self.raster_step)
+
+    def strip_done(self, key, strip, image):
+        self.strips[(key, strip)] = image
+        while len(self.strips) > STRIP_CACHE:
+            self.strips.popitem(last=False)
+        if key != self.level_key:
+            return
+        # swap the strip's rectangles in view for the image
+        first = max(self.tile_first_col, strip * STRIP_COLS)
+        last = min(self.tile_last_col, (strip + 1) * STRIP_COLS - 1)
+        if first <= last:
+            for c in range(first, last + 1):
+                self.delete_tile_column(c)
+                self.create_tile_column(c)
+            self.canvas.tag_raise("sprite")
+            self.canvas.tag_raise("hud")
+
+    # drops pending rasterizing, for when the canvas is cleared for a menu
+    def stop(self):
+        if self.raster_id is not None:
+            self.canvas.after_cancel(self.raster_id)
+            self.raster_id = None
+        self.raster_queue.clear()
+        self.raster_job = None
+        self.preload_target = None
+
+    # --- SPRITES ---
+    def draw_igrik(self, px, py, w, h, tag):
+        canvas = self.canvas
+        # body
+        canvas.create_oval(px - w/2, py - h/2, px + w/2, py + h/2, fill="green", tags=tag, outline="")
+        # eyes
+        canvas.create_oval(px - w*0.2 - 7, py - h*0.15 - 7, px - w*0.2 + 7, py - h*0.15 + 7, fill="white", tags=tag, outline="")
+        canvas.create_oval(px + w*0.2 - 7, py - h*0.15 - 7, px + w*0.2 + 7, py - h*0.15 + 7, fill="white", tags=tag, outline="")
+        # pupils
+        canvas.create_oval(px - w*0.2 - 3, py - h*0.15 - 3, px - w*0.2 + 3, py - h*0.15 + 3, fill="black", tags=tag, outline="")
+        canvas.create_oval(px + w*0.2 - 3, py - h*0.15 - 3, px + w*0.2 + 3, py - h*0.15 + 3, fill="black", tags=tag, outline="")
+        # mouth
+        canvas.create_oval(px - w*0.25, py + h*0.08, px + w*0.25, py + h*0.3, fill="red", tags=tag, outline="")
+
+    def draw_player(self, px, py, p, tags):
+        self.draw_igrik(px, py, p.w, p.h, tags)
+
+    def draw_enemy(self, ex, ey, e, tags):
+        canvas = self.canvas
+        canvas.create_oval(ex - e.hw, ey - e.hh, ex + e.hw, ey + e.hh, fill="brown", tags=tags)
+        canvas.create_rectangle(ex - 6, ey + e.h/4, ex + 6, ey + e.h/4 + 8, fill="black", tags=tags)
+
+    def draw_boss(self, bx, by, b, tags):
+        canvas = self.canvas
+        # body
+        canvas.create_oval(bx - b.hw, by - b.hh, bx + b.hw, by + b.hh, fill="red", tags=tags)
+        # wings (simple polygons)
+        wing_offset_y = b.h * 0.15
+        canvas.create_polygon(bx - b.hw + 8, by - b.h/4,
+                              bx - b.hw - b.w*0.35, by - b.hh - wing_offset_y,
+                              bx - b.hw + 8, by + b.h/6,
+                              fill="darkred", tags=tags, outline="")
+        canvas.create_polygon(bx + b.hw - 8, by - b.h/4,
+                              bx + b.hw + b.w*0.35, by - b.hh - wing_offset_y,
+                              bx + b.hw - 8, by + b.h/6,
+                              fill="darkred", tags=tags, outline="")
+        # eyes
+        eye_x = b.w * 0.18
+        canvas.create_oval(bx - eye_x - 6, by - b.h/4 - 6, bx - eye_x + 6, by - b.h/4 + 6, fill="green", tags=tags)
+        canvas.create_oval(bx + eye_x - 6, by - b.h/4 - 6, bx + eye_x + 6, by - b.h/4 + 6, fill="green", tags=tags)
+        # horns
+        canvas.create_polygon(bx - b.w/6, by - b.hh, bx - b.w/6 - 10, by - b.hh - 20, bx - b.w/6 + 10, by - b.hh - 8, fill="yellow", tags=tags)
+        canvas.create_polygon(bx + b.w/6, by - b.hh, bx + b.w/6 + 10, by - b.hh - 20, bx + b.w/6 - 10, by - b.hh - 8, fill="yellow", tags=tags)
+        # HP text above boss
+        b.hp_id = canvas.create_text(bx, by - b.hh - 12, text=f"HP: {b.hp}", fill="white", tags=tags)
+        b.hp_shown = b.hp
+
+    def draw_fireball(self, px, py, r, tags):
+        self.canvas.create_oval(px - r, py - r, px + r, py + r, fill="orange", tags=tags)
+
+    def sync_sprite(self, a, sx, sy, draw, seen):
+        tag = a.sprite
+        if tag is None:
+            self.sprite_seq += 1
+            tag = a.sprite = f"spr{self.sprite_seq}"
+            draw(sx, sy, a, ("sprite", tag))
+        else:
+            ox, oy = a.sprite_pos
+            if sx != ox or sy != oy:
+                self.canvas.move(tag, sx - ox, sy - oy)
+        a.sprite_pos = (sx, sy)
+        seen[tag] = a
+
+    # projectiles have no per-shot object; their sprites are keyed on the shot id
+    def sync_projectiles(self, buf, prefix, cam_x, alpha, seen):
+        shot_pos = self.shot_pos
+        xs, ys, pxs, pys, ids = buf.x, buf.y, buf.px, buf.py, buf.id
+        x1 = -CULL_MARGIN; x2 = WIDTH + CULL_MARGIN
+        for i in range(len(buf)):
+            sx = pxs[i] + (xs[i] - pxs[i]) * alpha - cam_x
+            if sx < x1 or sx > x2:
+                continue
+            sy = pys[i] + (ys[i] - pys[i]) * alpha
+            tag = prefix + str(ids[i])
+            pos = shot_pos.get(tag)
+            if pos is None:
+                self.sprite_seq += 1
+                self.draw_fireball(sx, sy, buf.r, ("sprite", tag))
+            elif sx != pos[0] or sy != pos[1]:
+                self.canvas.move(tag, sx - pos[0], sy - pos[1])
+            shot_pos[tag] = (sx, sy)
+            seen[tag] = None
+
+    def reset_sprites(self):
+        self.canvas.delete("sprite")
+        for a in self.drawn_sprites.values():
+            if a is not None:
+                a.sprite = None
+        self.drawn_sprites = {}
+        self.shot_pos.clear()
+        self.world.player.sprite = None
+
+    # --- RENDER ---
+    # alpha is how far (0..1) the frame lies between the last two simulation steps
+    def render(self, alpha=1.0):
+        world = self.world
+        canvas = self.canvas
+        cam_x = world.prev_camera_x + (world.camera_x - world.prev_camera_x) * alpha
+        self.scroll_tile_layer(cam_x)
+        seen = {}
+        first_new_sprite = self.sprite_seq + 1
+        sync_sprite = self.sync_sprite
+        view_x1 = cam_x - CULL_MARGIN
+        view_x2 = cam_x + WIDTH + CULL_MARGIN
+
+        # draw enemies
+        for e in world.enemies_between(view_x1, view_x2):
+            x, y = lerp_pos(e, alpha)
+            sync_sprite(e, x - cam_x, y, self.draw_enemy, seen)
+
+        # draw boss (classic stationary red dragon); its wings stick out
+        # a further 35% of its width each side
+        boss = world.boss
+        if boss and boss.alive and boss.x + boss.w * 0.85 >= view_x1 and boss.x - boss.w * 0.85 <= view_x2:
+            sync_sprite(boss, boss.x - cam_x, boss.y, self.draw_boss, seen)
+            if boss.hp_shown != boss.hp:
+                canvas.itemconfigure(boss.hp_id, text=f"HP: {boss.hp}")
+                boss.hp_shown = boss.hp
+
+        # hostile projectiles (orange)
+        self.sync_projectiles(world.projectiles, "hf", cam_x, alpha, seen)
+
+        # player fireballs (orange)
+        self.sync_projectiles(world.player_fireballs, "pf", cam_x, alpha, seen)
+
+        # draw player (kept above anything spawned after it)
+        player = world.player
+        if self.sprite_seq >= first_new_sprite and player.sprite is not None:
+            canvas.tag_raise(player.sprite)
+            canvas.tag_raise("hud")
+        x, y = lerp_pos(player, alpha)
+        sync_sprite(player, x - cam_x, y, self.draw_player, seen)
+
+        # delete the sprites of actors that were removed, died or left the view
+        for tag, a in self.drawn_sprites.items():
+            if tag not in seen:
+                canvas.delete(tag)
+                if a is None:
+                    self.shot_pos.pop(tag, None)
+                else:
+                    a.sprite = None
+        self.drawn_sprites = seen
+
+def lerp_pos(a, alpha):
+    return a.px + (a.x - a.px) * alpha, a.py + (a.y - a.py) * alpha
+
+# --- HUD ---
+# Named text items created once per game. set() compares the new value with
+# the one on screen and only formats it and reconfigures the item when it
+# changed, so an unchanged HUD costs no Tk calls per frame. fmt is a format
+# string or a function of the value.
+class Hud:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.slots = {}               # name -> [item id, fmt, value shown, visible]
+
+    def add(self, name, x, y, fmt, anchor='w', visible=True):
+        item = self.canvas.create_text(x, y, text="", fill="white", anchor=anchor, font=("Helvetica", 14),
+                                       state='normal' if visible else 'hidden', tags="hud")
+        self.slots[name] = [item, fmt, None, visible]
+
+    def set(self, name, value):
+        slot = self.slots[name]
+        if slot[2] != value:
+            slot[2] = value
+            fmt = slot[1]
+            self.canvas.itemconfigure(slot[0], text=fmt(value) if callable(fmt) else fmt.format(value))
+
+    def show(self, name, visible):
+        slot = self.slots[name]
+        if slot[3] != visible:
+            slot[3] = visible
+            self.canvas.itemconfigure(slot[0], state='normal' if visible else 'hidden')
 
 # --- GAME STATE ---
-current_level_index = 0
-level_map, level_bg, has_boss = levels[current_level_index]
-
-camera_x = 0.0
-
-player = {
-    'w': int(TILE_SIZE * 0.8),
-    'h': int(TILE_SIZE * 0.9),
-    'x': 0.0, 'y': 0.0,
-    'vx': 0.0, 'vy': 0.0,
-    'on_ground': False,
-    'lives': LIVES_START,
-    'invuln': 0.0
-}
+world = World(levels)
+root = None
+canvas = None
+renderer = None
 
-score = 0
+# HUD, created for each game
+hud = None
 
-# Enemies and boss lists
-enemies = []
-projectiles = []       # hostile (boss) fireballs
-player_fireballs = []  # friendly (player) fireballs — only damage boss
-boss = None
+# F3 attaches the profiler to the world and shows the overlay
+profiler = FrameProfiler(record=True)
 
-# --- TKINTER UI ---
-root = Tk()
-root.title("Igrik's World")
-canvas = Canvas(root, width=WIDTH, height=HEIGHT, highlightthickness=0)
-canvas.pack()
+# with --record, each game's inputs are written to its own file numbered
+# after record_path (session.igr gives session-1.igr, session-2.igr, ...)
+record_path = None
+recorder = None
+
+# endless runs use this seed, or a new one each run if it is None
+endless_seed = None
 
-# HUD (created but will be hidden during gameplay)
-score_id = canvas.create_text(80, 18, text="Score: 0", fill="white", anchor='w', font=("Helvetica", 14))
-lives_id = canvas.create_text(80, 38, text=f"Lives: {player['lives']}", fill="white", anchor='w', font=("Helvetica", 14))
-level_id = canvas.create_text(WIDTH - 10, 18, text=f"Level: 1/12", fill="white", anchor='e', font=("Helvetica", 14))
+# the last seconds of the game, recorded each frame, for rewinding
+rewinder = RewindBuffer()
 
 # --- INPUT ---
 keys = set()
-jump_pressed = False
-jump_held = False
+inputs = Inputs()
 state = "title"
 
 def on_key_press(ev):
-    global jump_pressed, jump_held, state
     k = ev.keysym.lower()
     # start on Enter from title
     if state == "title" and ev.keysym == "Return":
         start_new_game()
         return
     keys.add(k)
-    if k == 'space' and not jump_held:
-        jump_pressed = True
-        jump_held = True
-    # SHIFT to shoot — only when boss alive in boss level
+    if k == 'space' and not inputs.jump_held:
+        inputs.jump_pressed = True
+        inputs.jump_held = True
+    # SHIFT to shoot — the world decides whether there is a boss to shoot at
     if ev.keysym in ('Shift_L', 'Shift_R'):
-        if has_boss and boss and boss.get('alive', False):
-            # direction based on boss position relative to player
-            direction = 1 if boss['x'] > player['x'] else -1
-            spawn_player_fireball(player['x'] + direction*(player['w']/2 + 6), player['y'] - 8, direction * 420)
+        inputs.shoot = True
+    if ev.keysym == 'F3':
+        toggle_profiler()
+    if ev.keysym == 'F4':
+        profiler.write_csv(PROFILE_TRACE + '.csv')
+        profiler.write_json(PROFILE_TRACE + '.json')
+    if ev.keysym == 'F5' and state == "game":
+        quicksave()
+    if ev.keysym == 'F9' and state == "game" and os.path.exists(QUICKSAVE_PATH):
+        resume_game(QUICKSAVE_PATH)
 
 def on_key_release(ev):
-    global jump_held
     k = ev.keysym.lower()
     if k in keys:
         keys.remove(k)
     if k == 'space':
-        jump_held = False
-
-root.bind_all("<KeyPress>", on_key_press)
-root.bind_all("<KeyRelease>", on_key_release)
-
-# --- TILE & COLLISION HELPERS ---
-def tile_at(col, row):
-    if 0 <= col < MAP_W and 0 <= row < MAP_H:
-        return level_map[row][col]
-    return ' '
-
-def world_to_tile(px, py):
-    return int(px // TILE_SIZE), int(py // TILE_SIZE)
-
-def rects_overlap(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
-    return not (ax2 <= bx1 or ax1 >= bx2 or ay2 <= by1 or ay1 >= by2)
-
-def get_solid_tiles(x, y, w, h):
-    left = int((x - w/2) // TILE_SIZE)
-    right = int((x + w/2) // TILE_SIZE)
-    top = int((y - h/2) // TILE_SIZE)
-    bottom = int((y + h/2) // TILE_SIZE)
-    tiles = []
-    for r in range(top, bottom + 1):
-        for c in range(left, right + 1):
-            t = tile_at(c, r)
-            if t != ' ':
-                tiles.append((c, r, t, c*TILE_SIZE, r*TILE_SIZE, (c+1)*TILE_SIZE, (r+1)*TILE_SIZE))
-    return tiles
-
-# --- DRAW PLAYER (Igrik) ---
-def draw_igrik(px, py, w, h, tag):
-    # body
-    canvas.create_oval(px - w/2, py - h/2, px + w/2, py + h/2, fill="green", tags=tag, outline="")
-    # eyes
-    canvas.create_oval(px - w*0.2 - 7, py - h*0.15 - 7, px - w*0.2 + 7, py - h*0.15 + 7, fill="white", tags=tag, outline="")
-    canvas.create_oval(px + w*0.2 - 7, py - h*0.15 - 7, px + w*0.2 + 7, py - h*0.15 + 7, fill="white", tags=tag, outline="")
-    # pupils
-    canvas.create_oval(px - w*0.2 - 3, py - h*0.15 - 3, px - w*0.2 + 3, py - h*0.15 + 3, fill="black", tags=tag, outline="")
-    canvas.create_oval(px + w*0.2 - 3, py - h*0.15 - 3, px + w*0.2 + 3, py - h*0.15 + 3, fill="black", tags=tag, outline="")
-    # mouth
-    canvas.create_oval(px - w*0.25, py + h*0.08, px + w*0.25, py + h*0.3, fill="red", tags=tag, outline="")
-
-# --- SPAWN HELPERS ---
-
-def spawn_fireball(x, y, vx):
-    projectiles.append({'x': x, 'y': y, 'vx': vx, 'r': 8})
-
-def spawn_player_fireball(x, y, vx):
-    player_fireballs.append({'x': x, 'y': y, 'vx': vx, 'r': 8})
-
-# --- BOSS FACTORY (classic stationary arena boss) ---
-def create_boss(player_x):
-    # place boss a bit to the right of player start so it's visible without extra walking
-    bx = player_x + 398
-    by = (MAP_H - 4) * TILE_SIZE  # stand above ground row
-    return {'x': bx, 'y': by, 'w': TILE_SIZE*3.6, 'h': TILE_SIZE*2.6, 'hp': 10, 'fire_timer': 0.0, 'alive': True}
-
-# --- LEVEL LOADING / PROGRESSION ---
-def find_start(maprows):
-    for r_i, row in enumerate(maprows):
-        c = row.find('s')
-        if c != -1:
-            px = c * TILE_SIZE + TILE_SIZE/2
-            py = r_i * TILE_SIZE + TILE_SIZE/2
-            return px, py
-    return TILE_SIZE*2, (MAP_H-2)*TILE_SIZE
-
-def load_level(index):
-    global level_map, level_bg, has_boss, camera_x, enemies, projectiles, boss, player_fireballs
-    enemies.clear(); projectiles.clear(); player_fireballs.clear(); boss = None
-    load = levels[index]
-    level_map_local = load[0]
-    level_bg_local = load[1]
-    has_boss_local = load[2]
-    globals()['level_map'] = level_map_local
-    globals()['level_bg'] = level_bg_local
-    globals()['has_boss'] = has_boss_local
-
-    
-    # spawn player at start
-    px, py = find_start(level_map_local)
-    player['x'] = px; player['y'] = py; player['vx'] = 0; player['vy'] = 0; player['on_ground'] = False; player['invuln'] = 0
-    globals()['camera_x'] = max(0.0, player['x'] - WIDTH//2)
-
-    # boss if level requires — classic arena (stationary)
-    if has_boss_local:
-        boss_local = create_boss(player['x'])
-        globals()['boss'] = boss_local
-
-    # hide HUD items while playing
-    canvas.itemconfigure(score_id, state='hidden')
-    canvas.itemconfigure(lives_id, state='hidden')
-    canvas.itemconfigure(level_id, state='hidden')
-
-def respawn_player():
-    player['lives'] -= 1
-    if player['lives'] <= 0:
-        show_title()
+        inputs.jump_held = False
+
+# --- PROFILER OVERLAY ---
+def toggle_profiler():
+    if world.profiler is None:
+        world.profiler = profiler
+        profiler.resume()
+        profiler.sample()
+    else:
+        world.profiler = None
+    if state == "game":
+        show_overlay()
+
+def show_overlay():
+    for name in ('frame', 'phases', 'fps'):
+        hud.show(name, world.profiler is not None)
+    if world.profiler:
+        update_overlay()
+
+def update_overlay():
+    p50, p95, p99 = profiler.percentiles()
+    means = profiler.sample()
+    hud.set('frame', f"frame p50 {p50*1000:.1f}  p95 {p95*1000:.1f}  p99 {p99*1000:.1f} ms")
+    hud.set('phases', "  ".join(f"{phase} {means[phase]*1000:.2f}" for phase in PHASES) + " ms")
+    hud.set('fps', 1 / p50 if p50 else 0)
+    canvas.tag_raise("hud")
+
+# --- HUD ---
+def create_hud():
+    global hud
+    hud = Hud(canvas)
+    hud.add('score', 80, 18, "Score: {}")
+    hud.add('lives', 80, 38, "Lives: {}")
+    hud.add('level', WIDTH - 10, 18, "{}", anchor='e')
+    # profiler overlay, shown while F3 is on
+    hud.add('frame', 80, 62, "{}", visible=False)
+    hud.add('phases', 80, 82, "{}", visible=False)
+    hud.add('fps', WIDTH - 10, 38, "{:.0f} fps", anchor='e', visible=False)
+    hud.add('message', WIDTH/2, HEIGHT - 30, "{}", anchor='center')
+
+def update_hud():
+    global message_until
+    hud.set('score', world.score)
+    hud.set('lives', world.player.lives)
+    if message_until and time() >= message_until:
+        message_until = 0.0
+        hud.set('message', "")
+
+# --- MESSAGES ---
+# Errors the player should know about, such as a save that failed, are shown
+# at the bottom of the HUD for MESSAGE_SECONDS during a game, and under the
+# title on the title screen. One shown as a game ends stays for the title.
+message = ""             # shown under the title when it is next drawn
+message_until = 0.0
+title_message = None     # the title screen's text item for it
+
+def show_message(text):
+    global message, message_until
+    if state == "game":
+        message = text
+        message_until = time() + MESSAGE_SECONDS
+        hud.set('message', text)
+    elif state == "title":
+        canvas.itemconfigure(title_message, text=text)
     else:
-        px, py = find_start(level_map)
-        player['x'] = px; player['y'] = py; player['vx'] = 0; player['vy'] = 0; player['on_ground'] = False
+        print(text, file=sys.stderr)
 
-def next_level():
-    global current_level_index
-    if boss and boss.get('alive', False):
-        return
-    if current_level_index + 1 < len(levels):
-        current_level_index += 1
-        load_level(current_level_index)
+# --- LEVEL LOADING ---
+def load_level_view():
+    renderer.build_level()
+    if getattr(world.level, 'endless', False):
+        hud.set('level', "Endless run")
     else:
-        show_title()
+        hud.set('level', f"Level: {world.current_level_index + 1}/{len(world.levels)}")
+    update_hud()
+    show_overlay()
+    canvas.tag_raise("hud")
+    start_preload()
+    autosave()
+
+# --- SAVES ---
+# The running game is autosaved at each level start and every AUTOSAVE_EVERY
+# seconds. The autosave is removed when the game ends or the window is
+# closed, so finding one at startup means the last session crashed. The
+# world is dumped between steps on the main thread; writing the file, fsync
+# included, is left to the saver thread, which also does the removal so it
+# can't overtake a write. Failed saves are shown with show_message().
+saver = ThreadPoolExecutor(max_workers=1)
+pending_autosave = None
+next_autosave = 0.0
+
+def write_save(path, blob):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    snapshot.write_snapshot(path, blob)
+
+def discard_save(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def quicksave():
+    try:
+        write_save(QUICKSAVE_PATH, snapshot.dump(world))
+    except OSError as e:
+        show_message(f"Quicksave failed: {e.strerror}")
+    else:
+        show_message("Saved")
+
+def autosave():
+    global next_autosave, pending_autosave
+    pending_autosave = saver.submit(write_save, AUTOSAVE_PATH, snapshot.dump(world))
+    next_autosave = time() + AUTOSAVE_EVERY
+
+# reports the last autosave once it is written, if it failed
+def check_autosave():
+    global pending_autosave
+    if pending_autosave is not None and pending_autosave.done():
+        error = pending_autosave.exception()
+        pending_autosave = None
+        if isinstance(error, OSError):
+            show_message(f"Autosave failed: {error.strerror}")
+        elif error is not None:
+            raise error
+
+# waits for the autosaves being written, then removes the autosave
+def remove_autosave():
+    try:
+        saver.submit(discard_save, AUTOSAVE_PATH).result()
+    except OSError as e:
+        show_message(f"Could not remove the autosave: {e.strerror}")
+
+# continues the game saved at path
+def resume_game(path):
+    global state
+    try:
+        # read after any autosave still being written
+        blob = saver.submit(snapshot.read_snapshot, path).result()
+        # a save from another version, or a damaged one, fails here and
+        # leaves the running game as it was
+        snapshot.restore(World(levels), blob, levels)
+    except OSError as e:
+        show_message(f"Could not load the save: {e.strerror}")
+        return
+    except ValueError as e:
+        show_message(f"Could not load the save: {e}")
+        return
+    # the recording ends with the game it recorded
+    stop_recording()
+    snapshot.restore(world, blob, levels)
+    state = "game"
+    rewinder.clear()
+    canvas.delete(ALL)
+    create_hud()
+    load_level_view()
+    game_loop_start()
+
+# --- PRELOADING ---
+# While a level is played, the next one is read and decoded and its first
+# background strips rasterized, a slice per idle callback, so reaching the
+# finish only swaps it in.
+preload_job = None
+preload_id = None
+
+def start_preload():
+    global preload_job, preload_id
+    stop_preload()
+    index = world.current_level_index + 1
+    if index < len(world.levels):
+        preload_job = world.preload(index)
+        preload_id = root.after_idle(preload_step)
+
+def preload_step():
+    global preload_job, preload_id
+    preload_id = None
+    try:
+        next(preload_job)
+    except StopIteration:
+        preload_job = None
+        pre = world.preloaded
+        renderer.preload(pre.level, pre.grid, pre.camera_x)
+        return
+    preload_id = root.after_idle(preload_step)
+
+def stop_preload():
+    global preload_job, preload_id
+    if preload_id is not None:
+        root.after_cancel(preload_id)
+        preload_id = None
+    preload_job = None
 
 # --- TITLE SCREEN ---
 def show_title():
-    global state
+    global state, title_message, message
     state = "title"
+    stop_preload()
+    renderer.stop()
     canvas.delete(ALL)
     canvas.configure(bg="lightblue")
     canvas.create_text(WIDTH/2, HEIGHT/4, text="IGRIK'S WORLD", font=("Helvetica", 48, "bold"), fill="white")
-    canvas.create_text(WIDTH/2, HEIGHT/4 + 48, text="", font=("Helvetica", 16), fill="white")
+    title_message = canvas.create_text(WIDTH/2, HEIGHT/4 + 48, text=message, font=("Helvetica", 16), fill="white")
+    message = ""
     def button(xc, yc, txt, cmd):
         rect = canvas.create_rectangle(xc-140, yc-28, xc+140, yc+28, fill="#8b8b8b", outline="black", width=4)
         label = canvas.create_text(xc, yc, text=txt, font=("Helvetica", 20, "bold"), fill="white")
@@ -584,300 +733,138 @@ def show_title():
         canvas.tag_bind(rect, "<Enter>", enter); canvas.tag_bind(label, "<Enter>", enter)
         canvas.tag_bind(rect, "<Leave>", leave); canvas.tag_bind(label, "<Leave>", leave)
         canvas.tag_bind(rect, "<Button-1>", click); canvas.tag_bind(label, "<Button-1>", click)
+    if os.path.exists(AUTOSAVE_PATH):
+        button(WIDTH/2, HEIGHT/2 - 80, "Resume", lambda: resume_game(AUTOSAVE_PATH))
     button(WIDTH/2, HEIGHT/2 - 10, "New Game", start_new_game)
-    button(WIDTH/2, HEIGHT/2 + 60, "Quit Game", root.destroy)
+    button(WIDTH/2, HEIGHT/2 + 60, "Endless Run", start_endless_run)
+    button(WIDTH/2, HEIGHT/2 + 130, "Quit Game", root.destroy)
     canvas.create_text(WIDTH/2, HEIGHT - 30, text="Copyright (C) Chucny 2025 All rights reserved.", fill="white")
 
-def start_new_game():
-    global state, current_level_index
+def start_endless_run():
+    seed = endless_seed if endless_seed is not None else int(time() * 1000) & 0xFFFFFFFF
+    start_new_game([GeneratedLevel(seed)])
+
+def start_new_game(game_levels=levels):
+    global state, recorder
     state = "game"
-    current_level_index = 0
-    player['lives'] = LIVES_START
     canvas.delete(ALL)
-    load_level(current_level_index)
+    stop_recording()
+    world.levels = game_levels
+    world.new_game()
+    rewinder.clear()
+    # replay.py plays recordings back on the shipped levels
+    if record_path and game_levels is levels:
+        path = session_path(record_path)
+        try:
+            recorder = InputRecorder(path, len(levels), world.current_level_index)
+        except OSError as e:
+            show_message(f"Not recording: {e.strerror or e}")
+    create_hud()
+    load_level_view()
     game_loop_start()
 
-# --- ENEMY PATROL (fixed single-move per update) ---
-def simulate_enemy(e, dt):
-    # move
-    e['x'] += e['vx'] * dt
-
-    # decide tile ahead and tile below that tile
-    sign = 1 if e['vx'] >= 0 else -1
-    ahead_x = e['x'] + sign * (e['w']/2 + 2)
-    foot_y = e['y'] + e['h']/2 + 2
-
-    ac, ar = world_to_tile(ahead_x, e['y'])
-    bc, br = world_to_tile(ahead_x, foot_y)
-
-    tile_ahead = tile_at(ac, ar)
-    tile_below_ahead = tile_at(bc, br)
+def stop_recording():
+    global recorder
+    if recorder:
+        recorder.close(world)
+        recorder = None
 
-    # reverse when wall ahead or no ground under the tile ahead
-    if tile_ahead != ' ' or tile_below_ahead == ' ':
-        e['vx'] *= -1
-        # tiny nudge to avoid getting stuck
-        e['x'] += e['vx'] * dt
-
-# --- MAIN UPDATE LOOP ---
+# --- MAIN LOOP CONTROL ---
 last_time = time()
+accumulator = 0.0
+loop_id = None
 
-def update(dt):
-    global camera_x, score, boss
-    if state != "game":
-        return
-
-    left = ('a' in keys or 'left' in keys)
-    right = ('d' in keys or 'right' in keys)
-
-    if left and not right:
-        player['vx'] -= WALK_ACCEL * dt
-    elif right and not left:
-        player['vx'] += WALK_ACCEL * dt
-    else:
-        # friction
-        if player['vx'] > 0:
-            player['vx'] = max(0.0, player['vx'] - FRICTION * dt)
-        elif player['vx'] < 0:
-            player['vx'] = min(0.0, player['vx'] + FRICTION * dt)
-
-    # clamp
-    if player['vx'] > MAX_RUN: player['vx'] = MAX_RUN
-    if player['vx'] < -MAX_RUN: player['vx'] = -MAX_RUN
-
-    global jump_pressed
-    if jump_pressed and player['on_ground']:
-        player['vy'] = -JUMP_SPEED
-        player['on_ground'] = False
-    jump_pressed = False
-    if (not jump_held) and player['vy'] < 0:
-        player['vy'] = player['vy'] * JUMP_CUTOFF
-
-    # gravity
-    player['vy'] += GRAVITY * dt
-    if player['vy'] > MAX_FALL:
-        player['vy'] = MAX_FALL
-
-    # horizontal movement & collision
-    new_x = player['x'] + player['vx'] * dt
-    half_w, half_h = player['w']/2, player['h']/2
-    solids = get_solid_tiles(new_x, player['y'], player['w'], player['h'])
-    if solids:
-        for c, r, ch, tx1, ty1, tx2, ty2 in solids:
-            if rects_overlap(new_x - half_w, player['y'] - half_h, new_x + half_w, player['y'] + half_h, tx1, ty1, tx2, ty2):
-                if player['vx'] > 0:
-                    new_x = tx1 - half_w - 0.001
-                elif player['vx'] < 0:
-                    new_x = tx2 + half_w + 0.001
-                player['vx'] = 0.0
-    player['x'] = new_x
-
-    # vertical movement & collision
-    new_y = player['y'] + player['vy'] * dt
-    solids = get_solid_tiles(player['x'], new_y, player['w'], player['h'])
-    player['on_ground'] = False
-    if solids:
-        for c, r, ch, tx1, ty1, tx2, ty2 in solids:
-            if rects_overlap(player['x'] - half_w, new_y - half_h, player['x'] + half_w, new_y + half_h, tx1, ty1, tx2, ty2):
-                if player['vy'] > 0:
-                    new_y = ty1 - half_h - 0.001
-                    player['vy'] = 0.0
-                    player['on_ground'] = True
-                    # finish tile finishes level only if boss not alive
-                    if ch == 'f' and (not boss or not boss.get('alive', False)):
-                        next_level()
-                elif player['vy'] < 0:
-                    new_y = ty2 + half_h + 0.001
-                    player['vy'] = 0.0
-    player['y'] = new_y
-
-    # falling into void
-    if player['y'] - half_h > MAP_H * TILE_SIZE + TILE_SIZE*2:
-        respawn_player()
-        return
-
-    # camera center on player
-    camera_x = player['x'] - WIDTH / 2
-    if camera_x < 0: camera_x = 0
-    max_cam = MAP_W * TILE_SIZE - WIDTH
-    if camera_x > max_cam: camera_x = max_cam
-
-    # update enemies (simulate_enemy moves them; do NOT move again)
-    for e in list(enemies):
-        simulate_enemy(e, dt)
-        # collision with player
-        if rects_overlap(e['x'] - e['w']/2, e['y'] - e['h']/2, e['x'] + e['w']/2, e['y'] + e['h']/2,
-                         player['x'] - half_w, player['y'] - half_h, player['x'] + half_w, player['y'] + half_h):
-            if player['vy'] > 150:
-                try:
-                    enemies.remove(e)
-                    score += 25
-                except ValueError:
-                    pass
-            else:
-                respawn_player()
-                return
-
-    # update boss (stationary arena)
-    if boss and boss.get('alive', False):
-        # boss is stationary but shoots periodically
-        boss['fire_timer'] += dt
-        if boss['fire_timer'] > 1.2:
-            boss['fire_timer'] = 0.0
-            # spawn projectile toward player (direction)
-            direction = -1 if boss['x'] > player['x'] else 1
-            spawn_fireball(boss['x'] - direction*30, boss['y'] - boss['h']/4, direction * 260)
-
-        # boss collision with player: if player lands on boss top while falling -> damage boss
-        if rects_overlap(boss['x'] - boss['w']/2, boss['y'] - boss['h']/2, boss['x'] + boss['w']/2, boss['y'] + boss['h']/2,
-                         player['x'] - half_w, player['y'] - half_h, player['x'] + half_w, player['y'] + half_h):
-            if player['vy'] > 150:
-                boss['hp'] -= 1
-                player['vy'] = -JUMP_SPEED*0.5
-                if boss['hp'] <= 0:
-                    boss['alive'] = False
-                    score += 500
-            else:
-                respawn_player()
-                return
-
-    # update hostile projectiles
-    for proj in list(projectiles):
-        proj['x'] += proj['vx'] * dt
-        proj['y'] += 60 * dt
-        # collision with player
-        if rects_overlap(proj['x'] - proj['r'], proj['y'] - proj['r'], proj['x'] + proj['r'], proj['y'] + proj['r'],
-                         player['x'] - half_w, player['y'] - half_h, player['x'] + half_w, player['y'] + half_h):
-            if proj in projectiles: projectiles.remove(proj)
-            respawn_player()
-            return
-        # collision with tiles
-        tc, tr = world_to_tile(proj['x'], proj['y'])
-        if tile_at(tc, tr) != ' ':
-            if proj in projectiles: projectiles.remove(proj)
-        # off-world cleanup
-        if proj['x'] < -100 or proj['x'] > MAP_W*TILE_SIZE + 100 or proj['y'] > MAP_H * TILE_SIZE + 300:
-            if proj in projectiles: projectiles.remove(proj)
-
-    # update player-fired fireballs (orange) — only damage boss
-    for pf in list(player_fireballs):
-        pf['x'] += pf['vx'] * dt
-        # boss collision
-        if boss and boss.get('alive', False):
-            if rects_overlap(pf['x'] - pf['r'], pf['y'] - pf['r'], pf['x'] + pf['r'], pf['y'] + pf['r'],
-                             boss['x'] - boss['w']/2, boss['y'] - boss['h']/2, boss['x'] + boss['w']/2, boss['y'] + boss['h']/2):
-                boss['hp'] -= 1
-                if pf in player_fireballs: player_fireballs.remove(pf)
-                if boss['hp'] <= 0:
-                    boss['alive'] = False
-                    score += 500
-                continue
-        # collision with tiles
-        tc, tr = world_to_tile(pf['x'], pf['y'])
-        if tile_at(tc, tr) != ' ':
-            if pf in player_fireballs: player_fireballs.remove(pf)
-            continue
-        if pf['x'] < -200 or pf['x'] > MAP_W*TILE_SIZE + 200 or pf['y'] > MAP_H * TILE_SIZE + 400 or pf['y'] < -200:
-            if pf in player_fireballs: player_fireballs.remove(pf)
-
-    # DRAW
-    render()
-
-# --- RENDER ---
-def render():
-    canvas.delete("world")
-    # background
-    canvas.create_rectangle(0, 0, WIDTH, HEIGHT, fill=level_bg, width=0, tags="world")
-    # draw visible tiles
-    first_col = int(camera_x // TILE_SIZE)
-    last_col = int((camera_x + WIDTH) // TILE_SIZE) + 1
-    first_col = max(0, first_col)
-    last_col = min(MAP_W - 1, last_col)
-    for r in range(MAP_H):
-        row = level_map[r]
-        for c in range(first_col, last_col + 1):
-            ch = row[c]
-            if ch != ' ':
-                color = TILE_COLORS.get(ch, 'grey')
-                x1 = c * TILE_SIZE - camera_x
-                y1 = r * TILE_SIZE
-                x2 = x1 + TILE_SIZE
-                y2 = y1 + TILE_SIZE
-                canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="black", tags="world")
-                # draw flag for finish
-                if ch == 'f':
-                    canvas.create_text(x1 + TILE_SIZE/2, y1 + TILE_SIZE/2, text="🏁", font=("Helvetica", 18), tags="world")
-
-    # draw enemies
-    for e in enemies:
-        ex = e['x'] - camera_x
-        ey = e['y']
-        canvas.create_oval(ex - e['w']/2, ey - e['h']/2, ex + e['w']/2, ey + e['h']/2, fill="brown", tags="world")
-        canvas.create_rectangle(ex - 6, ey + e['h']/4, ex + 6, ey + e['h']/4 + 8, fill="black", tags="world")
-
-    # draw boss (classic stationary red dragon)
-    if boss and boss.get('alive', False):
-        bx = boss['x'] - camera_x
-        by = boss['y']
-        # body
-        canvas.create_oval(bx - boss['w']/2, by - boss['h']/2, bx + boss['w']/2, by + boss['h']/2, fill="red", tags="world")
-        # wings (simple polygons)
-        wing_offset_y = boss['h'] * 0.15
-        canvas.create_polygon(bx - boss['w']/2 + 8, by - boss['h']/4,
-                              bx - boss['w']/2 - boss['w']*0.35, by - boss['h']/2 - wing_offset_y,
-                              bx - boss['w']/2 + 8, by + boss['h']/6,
-                              fill="darkred", tags="world", outline="")
-        canvas.create_polygon(bx + boss['w']/2 - 8, by - boss['h']/4,
-                              bx + boss['w']/2 + boss['w']*0.35, by - boss['h']/2 - wing_offset_y,
-                              bx + boss['w']/2 - 8, by + boss['h']/6,
-                              fill="darkred", tags="world", outline="")
-        # eyes
-        eye_x = boss['w'] * 0.18
-        canvas.create_oval(bx - eye_x - 6, by - boss['h']/4 - 6, bx - eye_x + 6, by - boss['h']/4 + 6, fill="green", tags="world")
-        canvas.create_oval(bx + eye_x - 6, by - boss['h']/4 - 6, bx + eye_x + 6, by - boss['h']/4 + 6, fill="green", tags="world")
-        # horns
-        canvas.create_polygon(bx - boss['w']/6, by - boss['h']/2, bx - boss['w']/6 - 10, by - boss['h']/2 - 20, bx - boss['w']/6 + 10, by - boss['h']/2 - 8, fill="yellow", tags="world")
-        canvas.create_polygon(bx + boss['w']/6, by - boss['h']/2, bx + boss['w']/6 + 10, by - boss['h']/2 - 20, bx + boss['w']/6 - 10, by - boss['h']/2 - 8, fill="yellow", tags="world")
-        # HP text above boss
-        canvas.create_text(bx, by - boss['h']/2 - 12, text=f"HP: {boss['hp']}", fill="white", tags="world")
-
-    # hostile projectiles (orange)
-    for p in projectiles:
-        px = p['x'] - camera_x
-        py = p['y']
-        canvas.create_oval(px - p['r'], py - p['r'], px + p['r'], py + p['r'], fill="orange", tags="world")
-
-    # player fireballs (orange)
-    for pf in player_fireballs:
-        px = pf['x'] - camera_x
-        py = pf['y']
-        canvas.create_oval(px - pf['r'], py - pf['r'], px + pf['r'], py + pf['r'], fill="orange", tags="world")
-
-    # draw player
-    px_screen = player['x'] - camera_x
-    py_screen = player['y']
-    draw_igrik(px_screen, py_screen, player['w'], player['h'], "world")
-
-    # ensure HUD (hidden in gameplay) is on top if title shows it
-    canvas.lift(score_id)
-    canvas.lift(lives_id)
-    canvas.lift(level_id)
-
-# --- MAIN LOOP CONTROL ---
 def game_loop_start():
-    global last_time
+    global last_time, accumulator
+    # a new game must not leave the previous game's loop running
+    if loop_id is not None:
+        root.after_cancel(loop_id)
     last_time = time()
+    accumulator = 0.0
+    profiler.resume()
     _loop()
 
 def _loop():
-    global last_time
+    global last_time, accumulator, loop_id
+    prof = world.profiler
+    if prof: prof.begin_frame()
     now = time()
-    dt = now - last_time
-    if dt > 0.1: dt = 0.1
+    frame_dt = now - last_time
+    if frame_dt > MAX_FRAME_DT: frame_dt = MAX_FRAME_DT
     last_time = now
-    update(dt)
-    root.after(int(1000 / FPS), _loop)
+    inputs.left = ('a' in keys or 'left' in keys)
+    inputs.right = ('d' in keys or 'right' in keys)
+    if prof: prof.mark('input')
+    level_index = world.current_level_index
+    if REWIND_KEY in keys:
+        # one recorded frame back per frame, so time runs backwards at the
+        # speed it was played; a recording can't follow that, so it is
+        # closed on the frame it ends with, before the world goes back
+        if len(rewinder):
+            stop_recording()
+            rewinder.step_back(world)
+        accumulator = 0.0
+        if world.current_level_index != level_index:
+            load_level_view()
+    else:
+        # run the simulation in fixed steps, however long the frame took
+        accumulator += frame_dt
+        steps = 0
+        while accumulator >= SIM_DT and world.state == "game":
+            if recorder: recorder.record(inputs)
+            world.step(SIM_DT, inputs)
+            accumulator -= SIM_DT
+            steps += 1
+            if prof: prof.steps += 1
+            if world.current_level_index != level_index:
+                level_index = world.current_level_index
+                load_level_view()
+        if steps and world.state == "game":
+            rewinder.record(world)
+    if world.state != "game":
+        # out of lives or past the last level
+        loop_id = None
+        stop_recording()
+        remove_autosave()
+        show_title()
+        return
+    if now >= next_autosave:
+        autosave()
+    check_autosave()
+    renderer.render(accumulator / SIM_DT)
+    update_hud()
+    if prof:
+        if prof.frames % OVERLAY_EVERY == 0:
+            update_overlay()
+        prof.mark('render')
+        prof.end_frame()
+    loop_id = root.after(int(1000 / FPS), _loop)
 
-# --- INITIALIZE TITLE ---
-show_title()
-root.mainloop()
+# --- TKINTER UI ---
+def main(record=None, seed=None):
+    global root, canvas, renderer, record_path, endless_seed, state
+    record_path = record
+    endless_seed = seed
+    root = Tk()
+    root.title("Igrik's World")
+    canvas = Canvas(root, width=WIDTH, height=HEIGHT, highlightthickness=0)
+    canvas.pack()
+    renderer = Renderer(canvas, world, PhotoImage)
+
+    root.bind_all("<KeyPress>", on_key_press)
+    root.bind_all("<KeyRelease>", on_key_release)
+
+    # --- INITIALIZE TITLE ---
+    show_title()
+    root.mainloop()
+    state = "closed"
+    stop_recording()
+    remove_autosave()
+    saver.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Igrik's World")
+    parser.add_argument('--record', metavar='PATH', help="record each game's inputs to a new file numbered after PATH: session.igr gives session-1.igr, session-2.igr, ... (replay with replay.py)")
+    parser.add_argument('--seed', type=int, help="level seed for endless runs (default: a new one each run)")
+    args = parser.parse_args()
+    main(args.record, args.seed)
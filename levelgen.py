@@ -0,0 +1,150 @@
+"""Seeded procedural levels for Igrik's World.
+
+GeneratedLevel builds a level out of the same tiles the hand-made ones use:
+'g' ground with 'q' earth below, gaps, floating 'g' platforms, 'q' pillars,
+'e' enemies on longer flat runs, the 's' start and the 'f' finish. Every
+chunk of CHUNK_W columns is a pure function of the seed and the chunk index,
+and the ground height where two chunks meet is one too, so chunks can be
+generated in any order, on demand, and the same seed always gives the same
+level. That makes the level a drop-in for the level pack entries
+world.TileGrid streams from: with no length it is endless, and only the
+chunks around the camera ever exist.
+
+Features are kept within what the player can jump (gaps of at most three
+tiles, steps of at most two); run reach.py over generated levels to check.
+
+    python levelgen.py SEED [LENGTH] > data/levels/20.txt
+"""
+
+import random
+import sys
+
+from world import CHUNK_W, MAP_H, TILE_SIZE
+
+ENDLESS_W = CHUNK_W << 24      # width given to endless levels, never reached
+MIN_GROUND, MAX_GROUND = 2, 5  # ground height in tiles
+EDGE = 4                       # flat columns at the end of each chunk
+ENEMY_CHANCE = 0.3             # of a flat run of 4+ columns getting an enemy
+
+class GeneratedLevel:
+    def __init__(self, seed, length=None, bg='skyblue', h=MAP_H):
+        self.seed = seed
+        self.endless = length is None
+        self.w = ENDLESS_W if length is None else max(length, CHUNK_W)
+        self.h = h
+        self.bg = bg
+        self.has_boss = False
+        self.key = ('generated', seed, self.w, h, bg)
+        # 's' sits on the ground in column 1; the player spawns inside it
+        self.start = (1 * TILE_SIZE + TILE_SIZE / 2, (h - self.edge_height(0) - 1) * TILE_SIZE + TILE_SIZE / 2)
+
+    def rng(self, *key):
+        return random.Random('/'.join(map(str, (self.seed,) + key)))
+
+    # ground height where chunk i starts
+    def edge_height(self, i):
+        if i == 0:
+            return MIN_GROUND
+        return self.rng('edge', i).randint(MIN_GROUND, MAX_GROUND - 1)
+
+    # column-major tile letters of chunk i, like world.Level.chunk()
+    def chunk(self, i):
+        h = self.h
+        rng = self.rng('chunk', i)
+        # enemies draw from their own stream so they don't change the terrain
+        enemy_rng = self.rng('enemies', i)
+        first = i * CHUNK_W
+        count = max(0, min(CHUNK_W, self.w - first))
+        out = bytearray(b' ' * (CHUNK_W * h))
+
+        def column(c, ground, top=b'g'):
+            base = c * h
+            if ground:
+                out[base + h - ground] = top[0]
+                out[base + h - ground + 1:base + h] = b'q' * (ground - 1)
+
+        ground = self.edge_height(i)
+        last = self.edge_height(i + 1)
+        c = 0
+        # the start area and the run-up to the finish stay flat
+        if i == 0:
+            while c < 6:
+                column(c, ground)
+                c += 1
+            out[1 * h + h - ground - 1] = ord('s')
+        finish = self.w - 3 - first if not self.endless and self.w - first <= CHUNK_W else None
+        end = min(count, CHUNK_W - EDGE) if finish is None else min(count, finish - 6)
+        while True:
+            kind = rng.random()
+            run = rng.randint(2, 6)
+            gap = rng.randint(1, 3)
+            width = rng.randint(2, 3)
+            # features never reach into the chunk's flat end
+            size = (run if kind < 0.35 else gap + 2 if kind < 0.55 else run if kind < 0.75
+                    else width + 5 if kind < 0.88 else 3)
+            if c + size > end:
+                break
+            if kind < 0.35:
+                # flat ground
+                for _ in range(run):
+                    column(c, ground); c += 1
+                if run >= 4 and enemy_rng.random() < ENEMY_CHANCE:
+                    out[(c - run // 2) * h + h - ground - 1] = ord('e')
+            elif kind < 0.55:
+                # gap, landing at a new height
+                c += gap
+                ground = max(MIN_GROUND, min(MAX_GROUND, ground + rng.randint(-1, 1)))
+                for _ in range(2):
+                    column(c, ground); c += 1
+            elif kind < 0.75:
+                # step up or down
+                ground = max(MIN_GROUND, min(MAX_GROUND, ground + rng.choice((-2, -1, 1, 2))))
+                for _ in range(run):
+                    column(c, ground); c += 1
+            elif kind < 0.88:
+                # floating platform over a wide gap
+                lift = rng.randint(2, 3)
+                column(c, ground); c += 1
+                for k in range(width + 2):
+                    if 0 < k <= width:
+                        out[(c + k) * h + h - ground - lift] = ord('g')
+                c += width + 2
+                for _ in range(2):
+                    column(c, ground); c += 1
+            else:
+                # 'q' pillar standing on the ground
+                tall = rng.randint(1, 2)
+                column(c, ground); c += 1
+                column(c, ground + tall, b'q'); c += 1
+                column(c, ground); c += 1
+        # walk back to the height the next chunk starts at (or the finish)
+        if finish is None:
+            target = last
+        else:
+            target = ground
+        while c < count:
+            column(c, target)
+            c += 1
+        if finish is not None:
+            out[finish * h + h - target] = ord('f')
+        return out
+
+    # the whole level as rows, top to bottom (finite levels only)
+    def rows(self):
+        if self.endless:
+            raise ValueError("an endless level has no rows")
+        h = self.h
+        tiles = bytearray()
+        for i in range(-(-self.w // CHUNK_W)):
+            tiles += self.chunk(i)
+        return [tiles[r:self.w * h:h].decode('latin-1').rstrip() for r in range(h)]
+
+if __name__ == '__main__':
+    seed = int(sys.argv[1])
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    level = GeneratedLevel(seed, length)
+    print(f"# Generated level, seed {seed}")
+    print(f"bg: {level.bg}")
+    print("boss: no")
+    print("---")
+    print('\n'.join(level.rows()))
@@ -0,0 +1,163 @@
+"""Level storage for Igrik's World.
+
+Levels are written as text in data/levels/*.txt and compiled by running
+``python levels.py`` into two files:
+
+* data/levels.pak -- each level's column-major tile grid cut into chunks of
+  CHUNK_W columns, every chunk zlib-compressed on its own, after a table of
+  the compressed chunk sizes;
+* data/levels.idx -- a fixed-size record per level (offset of its entry in
+  the pack, grid size, spawn position, boss flag, background colour).
+
+LevelStore reads single index records on demand and keeps the most recently
+used levels open. A level only reads and decompresses a chunk when the world
+first touches it, so neither startup cost nor memory depends on how many or
+how long the levels are.
+
+Source format: ``key: value`` header lines (``bg``, ``boss``), a ``---`` line,
+then the map rows top to bottom. Rows are padded like make_level() does, so
+trailing spaces and leading empty rows can be omitted. An ``e`` in the map
+spawns an enemy walking on the floor below it.
+"""
+
+import os
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+
+from world import CHUNK_W, make_level, compile_tiles, find_start
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SOURCE_DIR = os.path.join(DATA_DIR, 'levels')
+INDEX_PATH = os.path.join(DATA_DIR, 'levels.idx')
+PACK_PATH = os.path.join(DATA_DIR, 'levels.pak')
+
+INDEX_MAGIC = b'IGLI'
+PACK_MAGIC = b'IGLP'
+FORMAT_VERSION = 2
+INDEX_HEADER = struct.Struct('<4sHI')               # magic, version, level count
+# pack offset, width, height, spawn x, spawn y, boss flag, background
+INDEX_RECORD = struct.Struct('<QIHddB16s')
+CHUNK_SIZE = struct.Struct('<I')                    # one entry of a chunk size table
+
+# --- SOURCES ---
+def read_source(path):
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    meta = {}
+    for i, line in enumerate(lines):
+        if line.strip() == '---':
+            rows = lines[i + 1:]
+            break
+        if line.strip() and not line.startswith('#'):
+            key, _, value = line.partition(':')
+            meta[key.strip()] = value.strip()
+    else:
+        raise ValueError(f"{path}: missing '---' line before the map rows")
+    while rows and not rows[-1].strip():
+        rows.pop()
+    bg = meta.get('bg', 'skyblue')
+    has_boss = meta.get('boss', 'no').lower() in ('yes', 'true', '1')
+    return make_level(rows), bg, has_boss
+
+def source_files(src_dir=SOURCE_DIR):
+    return sorted(os.path.join(src_dir, n) for n in os.listdir(src_dir) if n.endswith('.txt'))
+
+# --- COMPILER ---
+def build(src_dir=SOURCE_DIR, index_path=INDEX_PATH, pack_path=PACK_PATH):
+    records = []
+    with open(pack_path, 'wb') as pack:
+        pack.write(PACK_MAGIC)
+        for path in source_files(src_dir):
+            rows, bg, has_boss = read_source(path)
+            tiles, kinds, w, h = compile_tiles(rows)
+            sx, sy = find_start(rows)
+            if len(bg) > 16:
+                raise ValueError(f"{path}: background name longer than 16 characters")
+            step = CHUNK_W * h
+            blobs = [zlib.compress(bytes(tiles[i:i + step]), 9) for i in range(0, len(tiles), step)]
+            records.append(INDEX_RECORD.pack(pack.tell(), w, h, sx, sy, has_boss, bg.encode('ascii')))
+            pack.write(b''.join(CHUNK_SIZE.pack(len(b)) for b in blobs))
+            pack.write(b''.join(blobs))
+    with open(index_path, 'wb') as index:
+        index.write(INDEX_HEADER.pack(INDEX_MAGIC, FORMAT_VERSION, len(records)))
+        index.write(b''.join(records))
+    return len(records)
+
+# --- STORE ---
+# One level in the pack. Holds only the chunk offsets; chunk(i) reads and
+# decompresses a single chunk, which is what world.TileGrid asks for.
+class PackedLevel:
+    __slots__ = ('pack_path', 'offsets', 'key', 'w', 'h', 'bg', 'has_boss', 'start')
+
+    def __init__(self, pack_path, offset, w, h, bg, has_boss, start):
+        self.pack_path = pack_path
+        self.key = (pack_path, offset)    # same for every read of this level
+        self.w = w
+        self.h = h
+        self.bg = bg
+        self.has_boss = has_boss
+        self.start = start
+        n = -(-w // CHUNK_W)
+        with open(pack_path, 'rb') as f:
+            f.seek(offset)
+            sizes = struct.unpack(f'<{n}I', f.read(n * CHUNK_SIZE.size))
+        pos = offset + n * CHUNK_SIZE.size
+        self.offsets = [pos]
+        for size in sizes:
+            pos += size
+            self.offsets.append(pos)
+
+    def chunk(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        with open(self.pack_path, 'rb') as f:
+            f.seek(start)
+            data = bytearray(zlib.decompress(f.read(end - start)))
+        return data + b' ' * (CHUNK_W * self.h - len(data))
+
+class LevelStore:
+    def __init__(self, index_path=INDEX_PATH, pack_path=PACK_PATH, cache_size=4):
+        self.index_path = index_path
+        self.pack_path = pack_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()    # level index -> PackedLevel, most recent last
+        self.count = None
+
+    def open(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.pack_path):
+            build(index_path=self.index_path, pack_path=self.pack_path)
+        with open(self.index_path, 'rb') as f:
+            magic, version, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{self.index_path}: not a version {FORMAT_VERSION} level index")
+        self.count = count
+
+    def __len__(self):
+        if self.count is None:
+            self.open()
+        return self.count
+
+    def __getitem__(self, i):
+        level = self.cache.get(i)
+        if level is not None:
+            self.cache.move_to_end(i)
+            return level
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        level = self.cache[i] = self.read(i)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return level
+
+    def read(self, i):
+        with open(self.index_path, 'rb') as f:
+            f.seek(INDEX_HEADER.size + i * INDEX_RECORD.size)
+            offset, w, h, sx, sy, has_boss, bg = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+        return PackedLevel(self.pack_path, offset, w, h, bg.rstrip(b'\0').decode('ascii'), bool(has_boss), (sx, sy))
+
+levels = LevelStore()
+
+if __name__ == '__main__':
+    n = build(*sys.argv[1:2])
+    print(f"compiled {n} levels into {PACK_PATH}")
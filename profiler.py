@@ -0,0 +1,142 @@
+"""Frame-time instrumentation for Igrik's World.
+
+FrameProfiler splits every rendered frame into phases. The game loop calls
+begin_frame() when a frame starts, mark(phase) as each phase ends and
+end_frame() once the frame is drawn. Each mark() is one clock read and one
+float add, so the profiler can stay on while playing. The world marks its own
+phases inside World.step() when a profiler is attached as world.profiler.
+
+Phases, in frame order:
+
+* input       -- reading keys and applying them; also gets loop overhead
+                 between steps and the rest of a step cut short by a
+                 respawn or level change;
+* player      -- player movement, tile collision and the camera;
+* enemies     -- enemy patrols and enemy/player contact;
+* boss        -- the boss and its attacks;
+* projectiles -- hostile and player fireballs;
+* render      -- syncing canvas items;
+* idle        -- time handed back to Tk between two frames.
+
+The last ``window`` frame times feed the rolling percentiles shown by the
+overlay. With ``record=True`` the last ``max_rows`` frames (ten minutes at
+60 fps by default) are kept and can be written out with write_csv() or
+write_json() for offline analysis.
+"""
+
+import csv
+import json
+from array import array
+from collections import deque
+from time import perf_counter
+
+PHASES = ('input', 'player', 'enemies', 'boss', 'projectiles', 'render', 'idle')
+MAX_ROWS = 36000           # recorded frames kept, oldest dropped first
+
+# value at fraction q (0..1) of already sorted values, nearest rank
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    i = int(q * len(sorted_values) + 0.5) - 1
+    return sorted_values[min(max(i, 0), len(sorted_values) - 1)]
+
+class FrameProfiler:
+    def __init__(self, window=600, record=False, max_rows=MAX_ROWS):
+        self.window = window
+        self.record = record
+        self.max_rows = max_rows
+        self.phase_time = dict.fromkeys(PHASES, 0.0)    # seconds in the current frame
+        self.totals = dict.fromkeys(PHASES, 0.0)        # seconds over all frames
+        self.frame_times = array('d', [0.0]) * window   # ring buffer of frame times
+        self.frames = 0
+        self.steps = 0                                  # simulation steps this frame
+        self.rows = deque(maxlen=max_rows)              # recorded frames, if record
+        self.frame_start = None
+        self.frame_end = None
+        self.last = 0.0
+        self.sampled_totals = dict(self.totals)         # totals at the last sample()
+        self.sampled_frames = 0
+
+    def reset(self):
+        self.__init__(self.window, self.record, self.max_rows)
+
+    # drop the frame in progress and the idle gap since the last one, for when
+    # the game loop was stopped in between
+    def resume(self):
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.frame_start = None
+        self.frame_end = None
+
+    # --- TIMING ---
+    def begin_frame(self):
+        now = perf_counter()
+        if self.frame_end is not None:
+            self.phase_time['idle'] += now - self.frame_end
+        self.last = now
+        if self.frame_start is None:
+            self.frame_start = now
+
+    def mark(self, phase):
+        now = perf_counter()
+        self.phase_time[phase] += now - self.last
+        self.last = now
+
+    # a frame's time is its own work plus the Tk idle time before it
+    def end_frame(self):
+        now = perf_counter()
+        start = self.frame_start
+        self.frame_end = now
+        self.frame_start = None
+        phase_time = self.phase_time
+        frame_time = now - start + phase_time['idle']
+        self.frame_times[self.frames % self.window] = frame_time
+        self.frames += 1
+        totals = self.totals
+        for phase in PHASES:
+            totals[phase] += phase_time[phase]
+        if self.record:
+            self.rows.append((self.frames, start, frame_time, self.steps) + tuple(phase_time[p] for p in PHASES))
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+
+    # --- STATISTICS ---
+    def percentiles(self, qs=(0.50, 0.95, 0.99)):
+        n = min(self.frames, self.window)
+        values = sorted(self.frame_times[:n])
+        return [percentile(values, q) for q in qs]
+
+    # mean seconds per frame of each phase
+    def phase_means(self):
+        n = self.frames or 1
+        return {phase: t / n for phase, t in self.totals.items()}
+
+    # mean seconds per frame of each phase since the previous sample()
+    def sample(self):
+        n = self.frames - self.sampled_frames
+        last = self.sampled_totals
+        means = {phase: (t - last[phase]) / n if n else 0.0 for phase, t in self.totals.items()}
+        self.sampled_totals = dict(self.totals)
+        self.sampled_frames = self.frames
+        return means
+
+    def summary(self):
+        p50, p95, p99 = self.percentiles()
+        return {'frames': self.frames, 'p50': p50, 'p95': p95, 'p99': p99,
+                'phases': self.phase_means()}
+
+    # --- EXPORT ---
+    def columns(self):
+        return ('frame', 'start', 'frame_time', 'steps') + PHASES
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns())
+            writer.writerows(self.rows)
+
+    def write_json(self, path):
+        columns = self.columns()
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(),
+                       'frames': [dict(zip(columns, row)) for row in self.rows]}, f)
@@ -0,0 +1,415 @@
+"""Reachability analysis for Igrik's World levels.
+
+analyze() works out, without running the game, where the player can get to
+in a level and whether the finish tile can be reached from the start.
+
+Standing spots are empty tiles with a solid tile underneath. Moves between
+them come from jump templates: short player trajectories simulated once with
+the world's physics (JUMP_SPEED, GRAVITY, MAX_RUN, JUMP_CUTOFF, ...) for a
+spread of run-ups, jump lengths and steering, reduced to the tile cells the
+player's box passes through. Templates are stored as a prefix tree of cell
+offsets and cached per set of physics constants.
+
+Checking a level works on its compiled tile kinds as bit sets: Python ints
+with a bit per tile. Each tree is followed once for all the standing spots
+together, the spots still in flight at a node being the bits of one int, so
+testing a cell for every spot at once is one AND with a shifted mask of the
+filled tiles. The moves found make a graph that is searched from the start.
+
+The analysis is optimistic in places (every jump may have a full run-up; a
+blocked jump is dropped rather than slid along the wall), so it is meant to
+flag levels that cannot be finished and areas that cannot be reached, not to
+prove a level easy. Enemies and the boss are not considered.
+
+    python reach.py                    # analyze every shipped level
+    python reach.py --generated 1000   # or generated ones, seeds 0-999
+"""
+
+import sys
+from collections import deque
+
+import world
+from world import TILE_SIZE, TILE_KIND, CHUNK_W, SOLID, FINISH, SIM_DT
+
+VOID = 3               # kind of the padded rows below the map: a fall into them is a death
+PAD_TOP = 10           # empty rows above the map, higher than any jump
+PAD_BOTTOM = 2
+MAX_AIR_STEPS = 360    # longest trajectory simulated for a template
+
+# --- JUMP TEMPLATES ---
+# Player trajectory from standing still on the floor of a tile, under the same
+# velocity integration as World.step() (world.accelerate()), with no tiles in
+# the way. direction is the side the player steers to, run whether it starts
+# at full speed, edge whether it starts at the centre of the tile or
+# overhanging the floor's edge on that side as far as it can, steer_steps how
+# long the direction is held and jump_steps how long jump is held (None:
+# walks off an edge instead of jumping). start resumes from an
+# (x, y, vx, vy, step) state instead. Yields the state after every step.
+def simulate(direction, run, edge, steer_steps, jump_steps, half_w, half_h, start=None):
+    dt = SIM_DT
+    if start is None:
+        x, y = TILE_SIZE / 2, TILE_SIZE - half_h - 0.001
+        if edge:
+            x += direction * (TILE_SIZE / 2 + half_w - 1)
+        vx = direction * world.MAX_RUN if run else 0.0
+        vy = -world.JUMP_SPEED if jump_steps is not None else 0.0
+        start = (x, y, vx, vy, 0)
+    body = world.Player()
+    body.x, body.y, body.vx, body.vy, first = start
+    accelerate = world.accelerate
+    for i in range(first, MAX_AIR_STEPS):
+        accelerate(body, direction if i < steer_steps else 0, jump_steps is not None and i < jump_steps, dt)
+        body.x += body.vx * dt
+        body.y += body.vy * dt
+        yield body.x, body.y, body.vx, body.vy, i + 1
+
+# tile cells a trajectory passes through, relative to the start tile: one
+# ((first col, last col, first row, last row, centre col, falling), state)
+# pair per change of cells, with the state on entering those cells
+def trajectory_cells(trajectory, half_w, half_h, max_rows):
+    cells = []
+    last = None
+    for state in trajectory:
+        x, y, vx, vy, i = state
+        entry = (int((x - half_w) // TILE_SIZE), int((x + half_w) // TILE_SIZE),
+                 int((y - half_h) // TILE_SIZE), int((y + half_h) // TILE_SIZE),
+                 int(x // TILE_SIZE), vy > 0)
+        if entry != last:
+            cells.append((entry, state))
+            last = entry
+        if entry[2] > max_rows:
+            break
+    return cells
+
+def jump_specs():
+    return [(direction, run, edge, steer_steps, jump_steps)
+            for direction in (-1, 1) for run in (False, True) for edge in (False, True)
+            for steer_steps in (0, 12, 30, MAX_AIR_STEPS)
+            for jump_steps in (3, 8, 16, 30, MAX_AIR_STEPS)]
+
+# walking off an edge; followed from the tile next to the spot
+def walk_off_specs(direction):
+    return [(direction, run, False, steer_steps, None)
+            for run in (False, True) for steer_steps in (0, 20, MAX_AIR_STEPS)]
+
+# Prefix tree of template cells for a grid of height h (padded). While it is
+# built a node is [body, feet, under, lands, bonk, children]: body and feet
+# are the index offsets, into the column-major grid, of the box's cells above
+# its bottom row and in it; under the cells below its top row. lands is set
+# when the box is falling and its feet just entered a new row, so solid feet
+# cells there mean landing rather than a collision. Rising nodes carry bonk,
+# the tree to follow when only the top row hits a ceiling: the rest of the
+# trajectory after World.step() has pushed the box under it and stopped it.
+#
+# The finished tree is a Templates, its nodes (new, body, feet, under, lands,
+# bonk, children) tuples. new holds the cells of body and feet that the
+# parent node doesn't cover: getting to a node means the parent's cells were
+# empty, so only those need testing.
+class Templates:
+    def __init__(self, roots, reach):
+        self.roots = roots
+        self.reach = reach            # largest absolute offset
+
+def build_trie(specs, half_w, half_h, h):
+    roots = {}
+    for spec in specs:
+        add_path(roots, spec, None, 0, half_w, half_h, h)
+    offsets = []
+    def freeze(children, parent):
+        nodes = []
+        for body, feet, under, lands, bonk, kids in children.values():
+            cells = body + feet
+            offsets.extend(cells)
+            nodes.append((tuple(o for o in cells if o not in parent), body, feet, under, lands,
+                          None if bonk is None else freeze(bonk, ()), freeze(kids, frozenset(cells))))
+        return tuple(nodes)
+    return Templates(freeze(roots, ()), max(map(abs, offsets)))
+
+def add_path(children, spec, start, prev_bottom, half_w, half_h, h):
+    for entry, state in trajectory_cells(simulate(*spec, half_w, half_h, start), half_w, half_h, h):
+        c0, c1, r0, r1, cx, falling = entry
+        node = children.get(entry)
+        if node is None:
+            cols = sorted(range(c0, c1 + 1), key=lambda c: c != cx)
+            body = tuple(c * h + r for c in cols for r in range(r0, r1))
+            feet = tuple(c * h + r1 for c in cols)
+            under = tuple(c * h + r for c in cols for r in range(r0 + 1, r1 + 1))
+            bonk = None
+            if not falling:
+                bonk = {}
+                x, y, vx, vy, i = state
+                add_path(bonk, spec, (x, (r0 + 1) * TILE_SIZE + half_h + 0.001, vx, 0.0, i), r1, half_w, half_h, h)
+            node = children[entry] = [body, feet, under, falling and r1 > prev_bottom, bonk, {}]
+        prev_bottom = r1
+        children = node[5]
+
+_tries = {}
+
+def templates(h, half_w, half_h):
+    key = (h, half_w, half_h, world.GRAVITY, world.MAX_FALL, world.WALK_ACCEL,
+           world.MAX_RUN, world.FRICTION, world.JUMP_SPEED, world.JUMP_CUTOFF)
+    tries = _tries.get(key)
+    if tries is None:
+        tries = _tries[key] = (build_trie(jump_specs(), half_w, half_h, h),
+                               build_trie(walk_off_specs(-1), half_w, half_h, h),
+                               build_trie(walk_off_specs(1), half_w, half_h, h))
+    return tries
+
+# --- GRID ---
+# Column-major tile kinds of a level with empty columns on both sides and
+# padding rows above (empty) and below (VOID), so the template cells of any
+# spot in the level are in the grid. pad is the number of padding columns
+# per side.
+class PaddedGrid:
+    def __init__(self, level, pad):
+        self.w = level.w
+        self.h = level.h + PAD_TOP + PAD_BOTTOM
+        self.pad = pad
+        column_pad = bytes(PAD_TOP)
+        column_void = bytes([VOID]) * PAD_BOTTOM
+        blank = (column_pad + bytes(level.h) + column_void) * pad
+        parts = [blank]
+        for i in range(-(-level.w // CHUNK_W)):
+            kinds = level.chunk(i).translate(TILE_KIND)
+            for c in range(min(CHUNK_W, level.w - i * CHUNK_W)):
+                parts.append(column_pad + kinds[c * level.h:(c + 1) * level.h] + column_void)
+        parts.append(blank)
+        self.kinds = b''.join(parts)
+
+    def index(self, col, row):
+        return (col + self.pad) * self.h + row + PAD_TOP
+
+    def tile(self, i):
+        return i // self.h - self.pad, i % self.h - PAD_TOP
+
+    # bit set of the cells whose kind is one of kinds
+    def mask(self, *kinds):
+        table = bytes(ord('1') if k in kinds else ord('0') for k in range(256))
+        return int(self.kinds.translate(table)[::-1], 2)
+
+# bits of m moved down by o, so bit i tells about index i + o
+def shift(m, o):
+    return m >> o if o >= 0 else m << -o
+
+# A cell mask shifted by each template offset it is looked up with, made on
+# first use; inverted, it has the bits of the cells the mask doesn't have.
+class ShiftedMasks(dict):
+    def __init__(self, m, invert=False):
+        self.m = m
+        self.invert = invert
+
+    def __missing__(self, o):
+        shifted = self[o] = ~shift(self.m, o) if self.invert else shift(self.m, o)
+        return shifted
+
+# indices of the set bits of m, lowest first
+def bit_indices(m):
+    digits = bin(m)
+    top = len(digits) - 1
+    k = digits.rfind('1')
+    while k > 1:
+        yield top - k
+        k = digits.rfind('1', 2, k)
+
+# --- SEARCH ---
+class Reachability:
+    def __init__(self, level, has_finish, start, spots, reachable, finish, traps):
+        self.level = level
+        self.has_finish = has_finish  # whether the level has a finish tile at all
+        self.start = start            # (col, row) the player stands on at the start
+        self.spots = spots            # all standing spots
+        self.reachable = reachable    # spots the player can get to
+        self.finish = finish          # reachable spots standing on a finish tile
+        self.traps = traps            # reachable spots the finish cannot be reached from
+
+    @property
+    def completable(self):
+        return bool(self.finish)
+
+    def dead_zones(self):
+        return spans(self.spots - self.reachable)
+
+    def trap_zones(self):
+        return spans(self.traps)
+
+# runs of horizontally adjacent spots as (row, first col, last col)
+def spans(spots):
+    found = []
+    for col, row in sorted(spots, key=lambda s: (s[1], s[0])):
+        if found and found[-1][0] == row and found[-1][2] == col - 1:
+            found[-1][2] = col
+        else:
+            found.append([row, col, col])
+    return [tuple(s) for s in found]
+
+# Follows a template tree from every spot in the bit set spots at once.
+# Adds the landings to moves: offset from the spot -> bit set of the spots
+# that land there. masks are the empty, filled and not-void ShiftedMasks.
+def follow(templates, spots, masks, moves):
+    empty, filled, not_void = masks
+    stack = [(templates.roots, spots)]
+    while stack:
+        nodes, spots = stack.pop()
+        for new, body, feet, under, lands, bonk, children in nodes:
+            flying = spots
+            for o in new:
+                flying &= empty[o]
+            if flying != spots:
+                # the spots that hit something here; this node decides what happens to them
+                hit = spots ^ flying
+                if bonk is not None:
+                    # rising: a ceiling in the top row stops the rise, anything else the jump
+                    for o in under:
+                        hit &= empty[o]
+                    if hit:
+                        stack.append((bonk, hit))
+                elif lands:
+                    for o in body:
+                        hit &= empty[o]
+                    for o in feet:
+                        hit &= not_void[o]
+                    # stand above the centre column if it has floor, else the edge
+                    for o in feet:
+                        floor = hit & filled[o]
+                        hit ^= floor
+                        floor &= empty[o - 1]
+                        if floor:
+                            moves[o - 1] = moves.get(o - 1, 0) | floor
+            if flying and children:
+                stack.append((children, flying))
+
+def analyze(level, half_w=None, half_h=None):
+    player = world.Player()
+    half_w = half_w if half_w is not None else player.hw
+    half_h = half_h if half_h is not None else player.hh
+    h = level.h + PAD_TOP + PAD_BOTTOM
+    jumps, walk_off_left, walk_off_right = templates(h, half_w, half_h)
+    reach_cols = max(t.reach for t in (jumps, walk_off_left, walk_off_right)) // h + 2
+    grid = PaddedGrid(level, reach_cols)
+    kinds = grid.kinds
+    to_tile = grid.tile
+
+    floors = grid.mask(SOLID, FINISH)
+    filled = floors | grid.mask(VOID)
+    masks = ShiftedMasks(filled, invert=True), ShiftedMasks(filled), ShiftedMasks(grid.mask(VOID), invert=True)
+    empty = masks[0]
+    # empty tiles with floor underneath, padding included (the tops of the
+    # highest tiles are there)
+    standing = empty[0] & shift(floors, 1)
+    spots = {(c, r) for c, r in map(to_tile, bit_indices(standing)) if 0 <= c < level.w and 0 <= r < level.h}
+
+    # the player spawns inside the start tile and is pushed out on top of it
+    sc, sr = int(level.start[0] // TILE_SIZE), int(level.start[1] // TILE_SIZE)
+    start = grid.index(sc, sr - 1)
+    sources = standing | 1 << start
+
+    # the moves from every spot, reachable or not: it costs the same
+    moves = {}
+    follow(jumps, sources, masks, moves)
+    for side, walk_off in ((-grid.h, walk_off_left), (grid.h, walk_off_right)):
+        # walk to the next spot
+        moves[side] = moves.get(side, 0) | sources & shift(standing, side)
+        # or off the edge, following the template from the tile beside the spot
+        off = {}
+        follow(walk_off, shift(sources, -side) & empty[0] & empty[1], masks, off)
+        for d, landed in off.items():
+            moves[side + d] = moves.get(side + d, 0) | shift(landed, side)
+    edges = {}
+    for d, movers in moves.items():
+        for i in bit_indices(movers):
+            edges.setdefault(i, []).append(i + d)
+
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        for j in edges.get(queue.popleft(), ()):
+            if j not in seen:
+                seen.add(j)
+                queue.append(j)
+
+    finish = {j for j in seen if kinds[j + 1] == FINISH}
+    # walk the edges backwards from the finish to find the spots it can be reached from
+    back = {}
+    for i in seen:
+        for j in edges.get(i, ()):
+            back.setdefault(j, []).append(i)
+    good = set(finish)
+    queue = deque(finish)
+    while queue:
+        for i in back.get(queue.popleft(), ()):
+            if i not in good:
+                good.add(i)
+                queue.append(i)
+
+    reachable = {to_tile(i) for i in seen}
+    return Reachability(level, FINISH in grid.kinds, to_tile(start), spots | {to_tile(start)}, reachable,
+                        {to_tile(i) for i in finish}, {to_tile(i) for i in seen - good})
+
+# --- COMMAND LINE ---
+def report(name, result):
+    if result.completable:
+        status = "completable"
+    else:
+        status = "FINISH UNREACHABLE" if result.has_finish else "NO FINISH TILE"
+    print(f"{name}: {status}, {len(result.reachable)}/{len(result.spots)} spots reachable")
+    for row, c0, c1 in result.dead_zones():
+        print(f"    dead zone: row {row}, columns {c0}-{c1}")
+    for row, c0, c1 in result.trap_zones():
+        print(f"    trap:      row {row}, columns {c0}-{c1}")
+
+# analyzes one generated level in a worker process; the Reachability holds
+# the level, so only the verdict comes back
+def _analyze_generated(args):
+    from levelgen import GeneratedLevel
+    seed, length = args
+    result = analyze(GeneratedLevel(seed, length))
+    return seed, result.has_finish, result.completable
+
+def main(argv=None):
+    import argparse
+    from multiprocessing import Pool
+    from time import perf_counter
+    parser = argparse.ArgumentParser(description="Check that the finish of each level can be reached")
+    parser.add_argument('--generated', type=int, metavar='COUNT',
+                        help="check COUNT generated levels (seeds 0 to COUNT-1) instead of the shipped ones")
+    parser.add_argument('--length', type=int, default=CHUNK_W * 4, help="columns of the generated levels")
+    parser.add_argument('--workers', type=int, default=1, help="processes checking generated levels")
+    args = parser.parse_args(argv)
+
+    t = perf_counter()
+    if args.generated is None:
+        from levels import levels
+        count = len(levels)
+        failed = 0
+        unfinishable = []
+        for n in range(count):
+            result = analyze(levels[n])
+            report(f"level {n + 1:2d}", result)
+            # a closing screen with no finish tile can't fail the check
+            if not result.has_finish:
+                unfinishable.append(n + 1)
+            elif not result.completable:
+                failed += 1
+        if unfinishable:
+            print(f"no finish, not checked: levels {', '.join(map(str, unfinishable))}")
+    else:
+        count = args.generated
+        jobs = [(seed, args.length) for seed in range(count)]
+        if args.workers > 1:
+            with Pool(args.workers) as pool:
+                verdicts = pool.map(_analyze_generated, jobs, chunksize=16)
+        else:
+            verdicts = map(_analyze_generated, jobs)
+        failed = 0
+        for seed, has_finish, completable in verdicts:
+            if not has_finish:
+                print(f"seed {seed}: NO FINISH TILE, not checked")
+            elif not completable:
+                print(f"seed {seed}: FINISH UNREACHABLE")
+                failed += 1
+    elapsed = perf_counter() - t
+    print(f"{count} levels in {elapsed:.2f} s ({count / elapsed:.0f} per second)")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Input recording and headless replay for Igrik's World.
+
+The world is deterministic for a given level set and sequence of per-step
+Inputs, so a session is fully described by the inputs fed to each
+World.step(). InputRecorder writes them as a compact binary stream:
+
+* header -- magic, format version, simulation rate, level count and the
+  level the game started on;
+* runs   -- (input bits, step count) pairs, one per stretch of identical
+  input, so holding a key for a minute costs three bytes;
+* end    -- a run of length 0, then a digest of the final world state.
+
+replay() feeds a recording back through a World at the fixed SIM_DT with no
+clock and no Tk, as fast as the simulation runs, and reports whether it ends
+in the recorded state. Run ``python replay.py session-1.igr`` to replay a file.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from time import perf_counter
+
+from world import World, Inputs, SIM_DT, SIM_HZ
+
+MAGIC = b'IGRR'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHHH')      # magic, version, sim rate, level count, start level
+RUN = struct.Struct('<BH')             # input bits, steps
+MAX_RUN_STEPS = 0xFFFF
+
+LEFT, RIGHT, JUMP_PRESSED, JUMP_HELD, SHOOT = 1, 2, 4, 8, 16
+
+def pack_inputs(inputs):
+    return ((LEFT if inputs.left else 0) | (RIGHT if inputs.right else 0)
+            | (JUMP_PRESSED if inputs.jump_pressed else 0) | (JUMP_HELD if inputs.jump_held else 0)
+            | (SHOOT if inputs.shoot else 0))
+
+def unpack_inputs(bits, inputs):
+    inputs.left = bool(bits & LEFT)
+    inputs.right = bool(bits & RIGHT)
+    inputs.jump_pressed = bool(bits & JUMP_PRESSED)
+    inputs.jump_held = bool(bits & JUMP_HELD)
+    inputs.shoot = bool(bits & SHOOT)
+
+# 16-byte digest of the state a replay must reproduce
+def state_digest(world):
+    player = world.player
+    boss = world.boss
+    state = (world.state, world.current_level_index, world.score, player.lives,
+             player.x, player.y, player.vx, player.vy,
+             len(world.enemies), len(world.projectiles), len(world.player_fireballs),
+             boss.hp if boss else -1)
+    return hashlib.md5(repr(state).encode()).digest()
+
+# --- RECORDING ---
+# First free numbered path for a recording: session.igr gives session-1.igr,
+# then session-2.igr, ..., so each game keeps its own file.
+def session_path(path):
+    root, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(f"{root}-{n}{ext}"):
+        n += 1
+    return f"{root}-{n}{ext}"
+
+class InputRecorder:
+    def __init__(self, path, level_count, start_level=0):
+        # never overwrite an earlier recording
+        self.f = open(path, 'xb')
+        self.f.write(HEADER.pack(MAGIC, FORMAT_VERSION, SIM_HZ, level_count, start_level))
+        self.bits = None
+        self.run = 0
+        self.steps = 0
+
+    # call with the inputs about to be passed to World.step()
+    def record(self, inputs):
+        bits = pack_inputs(inputs)
+        if bits == self.bits and self.run < MAX_RUN_STEPS:
+            self.run += 1
+        else:
+            self.flush_run()
+            self.bits = bits
+            self.run = 1
+        self.steps += 1
+
+    def flush_run(self):
+        if self.run:
+            self.f.write(RUN.pack(self.bits, self.run))
+            self.run = 0
+
+    def close(self, world):
+        if self.f.closed:
+            return
+        self.flush_run()
+        self.f.write(RUN.pack(0, 0))
+        self.f.write(state_digest(world))
+        self.f.close()
+
+# --- PLAYBACK ---
+class Recording:
+    def __init__(self, start_level, level_count, runs, digest):
+        self.start_level = start_level
+        self.level_count = level_count
+        self.runs = runs          # [(input bits, steps)]
+        self.digest = digest      # None if the recording was cut off
+
+    @property
+    def steps(self):
+        return sum(n for bits, n in self.runs)
+
+def read_recording(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, sim_hz, level_count, start_level = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path}: not a version {FORMAT_VERSION} input recording")
+    if sim_hz != SIM_HZ:
+        raise ValueError(f"{path}: recorded at {sim_hz} Hz, the simulation runs at {SIM_HZ} Hz")
+    runs = []
+    digest = None
+    pos = HEADER.size
+    # a session that crashed has no end marker; replay what was written
+    while pos + RUN.size <= len(data):
+        bits, n = RUN.unpack_from(data, pos)
+        pos += RUN.size
+        if n == 0:
+            digest = data[pos:pos + 16]
+            break
+        runs.append((bits, n))
+    return Recording(start_level, level_count, runs, digest)
+
+# Steps a new World through the recording; returns the world and whether
+# its final state matches the recorded digest (None if there is none).
+def replay(recording, levels):
+    if len(levels) != recording.level_count:
+        raise ValueError(f"recorded with {recording.level_count} levels, {len(levels)} are loaded")
+    world = World(levels)
+    world.new_game(recording.start_level)
+    inputs = Inputs()
+    step = world.step
+    for bits, n in recording.runs:
+        for _ in range(n):
+            # step() clears the jump and shoot edges, so set them every step
+            unpack_inputs(bits, inputs)
+            step(SIM_DT, inputs)
+    if recording.digest is None:
+        return world, None
+    return world, state_digest(world) == recording.digest
+
+if __name__ == '__main__':
+    from levels import levels
+    recording = read_recording(sys.argv[1])
+    t = perf_counter()
+    world, match = replay(recording, levels)
+    elapsed = perf_counter() - t
+    steps = recording.steps
+    print(f"{steps} steps ({steps / SIM_HZ:.1f} s of play) in {elapsed:.2f} s, "
+          f"{steps / elapsed if elapsed else 0:.0f} steps/s")
+    print(f"ended on level {world.current_level_index + 1}, state {world.state}, "
+          f"score {world.score}, lives {world.player.lives}")
+    if match is None:
+        print("recording has no end state to check")
+    else:
+        print("end state matches" if match else "end state DIFFERS from the recording")
+        sys.exit(0 if match else 1)
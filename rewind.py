@@ -0,0 +1,139 @@
+"""Rewind buffer for Igrik's World.
+
+RewindBuffer keeps the recent history of a World as snapshot.py blobs, one
+per recorded frame, so the game can be stepped backwards. Only the latest
+blob is kept whole. Each older frame is stored as its delta to the frame
+after it: the bytes XORed over the common length, plus the tail of the
+longer blob, zlib-compressed. Most fields don't change between frames or
+change only in their low bytes, so the delta is mostly zeros and
+compresses to a few dozen bytes. The XOR works both ways, so stepping
+back one frame costs one decompress, one XOR and a restore.
+
+The history is bounded by a frame count and by a byte budget, whichever is
+reached first; the oldest frames are dropped. nbytes counts the memory the
+stored deltas take, Python object headers included.
+
+    python rewind.py [--seconds 10] [--levels 1-5]
+
+plays levels with a bot, recording every frame, and prints the memory the
+history takes and the time a record and a step back take.
+"""
+
+import argparse
+import random
+import struct
+import sys
+import zlib
+from collections import deque
+from time import perf_counter
+
+from snapshot import dump, restore
+
+REWIND_SECONDS = 10            # history kept by default
+FRAME_HZ = 60                  # frames recorded per second of play
+MAX_BYTES = 4 << 20            # memory budget for the history
+DELTA = struct.Struct('<I')    # length of the older blob, before the compressed delta
+
+# XOR of a and b over their common length, followed by the longer one's
+# tail; gives either blob back from the other
+def xor_delta(a, b):
+    m = min(len(a), len(b))
+    x = int.from_bytes(a[:m], 'little') ^ int.from_bytes(b[:m], 'little')
+    return x.to_bytes(m, 'little') + (a[m:] if len(a) > m else b[m:])
+
+class RewindBuffer:
+    def __init__(self, seconds=REWIND_SECONDS, frame_hz=FRAME_HZ, max_bytes=MAX_BYTES):
+        self.capacity = int(seconds * frame_hz)
+        self.max_bytes = max_bytes
+        self.deltas = deque()     # oldest first; deltas[-1] leads from current to the frame before
+        self.current = None       # blob of the latest frame
+        self.nbytes = 0
+
+    # frames that can be stepped back
+    def __len__(self):
+        return len(self.deltas)
+
+    def clear(self):
+        self.deltas.clear()
+        self.current = None
+        self.nbytes = 0
+
+    def record(self, world):
+        blob = dump(world)
+        prev = self.current
+        self.current = blob
+        if prev is None:
+            return
+        delta = DELTA.pack(len(prev)) + zlib.compress(xor_delta(prev, blob), 1)
+        self.deltas.append(delta)
+        self.nbytes += sys.getsizeof(delta)
+        while self.deltas and (len(self.deltas) > self.capacity or self.nbytes > self.max_bytes):
+            self.nbytes -= sys.getsizeof(self.deltas.popleft())
+
+    # restores the frame before the latest one and makes it the latest;
+    # returns False once the history is used up
+    def step_back(self, world):
+        if not self.deltas:
+            return False
+        delta = self.deltas.pop()
+        self.nbytes -= sys.getsizeof(delta)
+        size, = DELTA.unpack_from(delta)
+        d = zlib.decompress(delta[DELTA.size:])
+        self.current = xor_delta(self.current, d)[:size]
+        restore(world, self.current, world.levels)
+        return True
+
+# --- MEASURING ---
+def measure(level_index, seconds, steps_per_frame):
+    from levels import levels
+    # rollouts brings in multiprocessing; the game only needs RewindBuffer
+    from rollouts import Explorer
+    from world import World, Inputs, SIM_DT
+    world = World(levels)
+    world.new_game(level_index)
+    buf = RewindBuffer(seconds)
+    bot = Explorer(random.Random(level_index))
+    inputs = Inputs()
+    record_time = 0.0
+    frames = 0
+    # play until the history is full (or the level is over), recording each frame
+    while frames < buf.capacity + 1 and world.state == "game" and world.current_level_index == level_index:
+        for i in range(steps_per_frame):
+            bot(frames * steps_per_frame + i, world, inputs)
+            world.step(SIM_DT, inputs)
+        t = perf_counter()
+        buf.record(world)
+        record_time += perf_counter() - t
+        frames += 1
+    history = len(buf)
+    nbytes = buf.nbytes
+    blob_size = len(buf.current)
+    t = perf_counter()
+    while buf.step_back(world):
+        pass
+    back_time = perf_counter() - t
+    return {
+        'frames': history,
+        'history_kib': nbytes / 1024,
+        'bytes_per_frame': nbytes / history if history else 0.0,
+        'blob_bytes': blob_size,
+        'record_us': record_time / frames * 1e6,
+        'step_back_us': back_time / history * 1e6 if history else 0.0,
+    }
+
+def main(argv=None):
+    from levels import levels
+    from rollouts import parse_levels
+    from world import SIM_HZ
+    parser = argparse.ArgumentParser(description="Measure the rewind buffer's memory and per-frame cost")
+    parser.add_argument('--seconds', type=float, default=REWIND_SECONDS, help="history to keep")
+    parser.add_argument('--levels', help="levels to play, 1-based, e.g. 1-5,9 (default: all)")
+    args = parser.parse_args(argv)
+    for index in parse_levels(args.levels, len(levels)):
+        r = measure(index, args.seconds, SIM_HZ // FRAME_HZ)
+        print(f"level {index + 1:2d}  {r['frames']:5d} frames  {r['history_kib']:7.1f} KiB  "
+              f"{r['bytes_per_frame']:5.0f} B/frame (blob {r['blob_bytes']} B)  "
+              f"record {r['record_us']:5.0f} us  step back {r['step_back_us']:5.0f} us")
+
+if __name__ == '__main__':
+    main()
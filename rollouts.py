@@ -0,0 +1,370 @@
+"""Parallel headless rollouts for Igrik's World.
+
+A rollout plays one level with a bot input policy in its own World, with no
+Tk and no clock, until the level is finished, the game ends or a step limit
+is reached. Rollouts are independent, so run_rollouts() spreads them over a
+process pool and aggregate() folds the results into per-level statistics:
+completion rate, time to finish, deaths and score.
+
+Physics constants (GRAVITY, JUMP_SPEED, MAX_RUN, ...) can be overridden per
+rollout to see how a change affects every level, e.g.
+
+    python rollouts.py --runs 8 --set JUMP_SPEED=850 --check
+
+checks that every level is still completed at least once with a lower jump.
+With the default constants ``python rollouts.py --runs 8 --check`` passes on
+the shipped levels; run it after changing the physics or the levels.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+from multiprocessing import Pool
+
+import world as world_module
+from world import World, Player, Inputs, SIM_DT, SIM_HZ, TILE_SIZE, LIVES_START, FINISH, CHUNK_W
+
+MAX_STEPS = SIM_HZ * 300       # give up on a level after five minutes of play
+
+# world constants a rollout may override
+TUNABLE = ('GRAVITY', 'MAX_FALL', 'WALK_ACCEL', 'MAX_RUN', 'FRICTION', 'JUMP_SPEED', 'JUMP_CUTOFF')
+DEFAULTS = {name: getattr(world_module, name) for name in TUNABLE}
+
+# --- POLICIES ---
+# A policy sets the Inputs for the next step from the world it sees. Policies
+# are looked up by name in POLICIES so rollouts can be sent to worker
+# processes as plain tuples.
+class Policy:
+    def __init__(self, rng):
+        self.rng = rng
+
+    def __call__(self, i, world, inputs):
+        pass
+
+class Idle(Policy):
+    pass
+
+# holds right and jumps on a fixed rhythm, like a first-time player
+class Walker(Policy):
+    def __call__(self, i, world, inputs):
+        inputs.right = True
+        if i % 45 == 0:
+            inputs.jump_pressed = inputs.jump_held = True
+        if i % 45 == 35:
+            inputs.jump_held = False
+
+# --- LOOKAHEAD ---
+# Where the player would get to from (x, y, vx, vy) steering in direction
+# (0: letting go) for up to steps steps with jump held for the first hold
+# of them, stepped as World.step() steps the player (world.accelerate() and
+# World.move_body()) on a stand-in body, under the constants now set in the
+# world module. Pass vy=-JUMP_SPEED for a jump taken now. Enemies are
+# ignored. Returns (x, y, outcome): outcome is 'fell' when the player drops
+# out of the map, 'finish' on landing on the finish, 'landed' on landing
+# after being in the air, 'blocked' when a wall stops a run and None if the
+# steps ran out.
+def predict(world, x, y, vx, vy, direction, hold, steps):
+    body = Player()
+    body.x, body.y, body.vx, body.vy = x, y, vx, vy
+    accelerate = world_module.accelerate
+    move_body = world.move_body
+    dt = SIM_DT
+    falling = world_module.GRAVITY * dt * 2
+    bottom = world.map_h * TILE_SIZE + TILE_SIZE * 2
+    airborne = vy != 0.0
+    for i in range(steps):
+        accelerate(body, direction, i < hold, dt)
+        vx = body.vx
+        landed = move_body(body, dt)
+        if vx and not body.vx and not airborne:
+            return body.x, body.y, 'blocked'
+        if landed == FINISH:
+            return body.x, body.y, 'finish'
+        if landed:
+            if airborne:
+                return body.x, body.y, 'landed'
+        elif body.vy > falling:
+            airborne = True
+        if body.y - body.hh > bottom:
+            return body.x, body.y, 'fell'
+    return body.x, body.y, None
+
+MAX_HOLD = 90                  # steps jump is held for the longest jump
+HOLDS = (MAX_HOLD, 40, 20, 8)  # jump lengths tried, longest first
+SCAN_COLS = 8                  # columns ahead checked for walls and drops
+LAND_STEPS = 300               # steps a jump or fall is followed for
+STEER_EVERY = 4                # steps between checks of where a fall lands
+EXPLORE_CHANCE = 0.05          # per step, of trying a jump up when stuck
+
+# Runs right and gets past walls, pits and enemies with predict(): once one
+# is a few columns ahead it tries jumps every step and takes the first that
+# lands past it, stopping short of a pit no jump clears. In the air it steers
+# (or lets go) so as not to fall out of the map. Backs off further each time
+# it gets stuck, and then also tries jumping up onto whatever it passes, to
+# find a way out of dead ends. Keeps out of a boss's reach while shooting it
+# and jumps its shots; rng adds timing jitter so repeated rollouts explore
+# different runs.
+class Explorer(Policy):
+    def __init__(self, rng):
+        super().__init__(rng)
+        self.hold = 0             # steps left to keep the jump held
+        self.back = 0             # steps left to walk left
+        self.backoffs = 0         # times stuck since the last progress
+        self.best_x = None
+        self.stuck = 0
+        self.lives = None
+        self.wait = 0             # steps left standing still after a spawn
+        self.failed = None        # where no jump worked last
+        self.steer = None         # direction held in the air, once chosen
+
+    def __call__(self, i, world, inputs):
+        p = world.player
+        # a fresh spawn overlaps the start tile; walking off at once gets the
+        # player pushed out sideways, so stand still until it has settled
+        if p.lives != self.lives:
+            self.lives = p.lives
+            self.wait = 30
+            self.best_x = p.x     # not progress: keep backing off as far
+            self.stuck = 0
+        if self.wait:
+            self.wait -= 1
+            inputs.left = inputs.right = False
+            return
+        if p.x > self.best_x + TILE_SIZE:
+            self.best_x = p.x
+            self.stuck = 0
+            self.backoffs = 0
+        else:
+            self.stuck += 1
+        # backing off further every time, to get out of dead ends
+        if self.stuck > SIM_HZ * 2 and not self.back:
+            self.backoffs += 1
+            self.back = self.rng.randint(10, 60) * self.backoffs
+            self.stuck = 0
+        if self.back:
+            self.back -= 1
+        direction = -1 if self.back else 1
+
+        boss = world.boss
+        if boss and boss.alive:
+            # hold back out of the boss's reach, shooting and jumping its shots
+            if not self.back and boss.x - p.x < boss.hw + TILE_SIZE * 6:
+                direction = 0
+            if i % 20 == 0:
+                inputs.shoot = True
+
+        if self.hold:
+            self.hold -= 1
+            if not self.hold:
+                inputs.jump_held = False
+        if p.on_ground:
+            # landed: the jump is over, however long it was meant to be held
+            self.hold = 0
+            inputs.jump_held = False
+            self.steer = None
+            hold = self.dodge(world) if boss and boss.alive else 0
+            if not hold and direction:
+                hold, direction = self.choose_jump(world, direction)
+            if hold:
+                inputs.jump_pressed = inputs.jump_held = True
+                self.hold = hold
+        elif i % STEER_EVERY == 0 or self.steer is None:
+            self.steer = self.choose_steer(world, direction)
+        if self.steer is not None:
+            direction = self.steer
+        inputs.right = direction > 0
+        inputs.left = direction < 0
+
+    # a full jump when a hostile shot is about to hit, else 0
+    def dodge(self, world):
+        p = world.player
+        shots = world.projectiles
+        for k in range(len(shots)):
+            ahead = shots.x[k] - p.x
+            if abs(shots.y[k] - p.y) < TILE_SIZE and ahead * shots.vx[k] < 0 and abs(ahead) < TILE_SIZE * 2.5:
+                return MAX_HOLD
+        return 0
+
+    # (jump length to jump with now or 0, direction to run in)
+    def choose_jump(self, world, direction):
+        p = world.player
+        trouble, pit = trouble_ahead(world, direction)
+        for e in world.enemies_between(p.x - TILE_SIZE * 3, p.x + TILE_SIZE * 3):
+            ahead = (e.x - p.x) * direction
+            if 0 < ahead < TILE_SIZE * 2.5 and abs(e.y - p.y) < TILE_SIZE:
+                if trouble is None or ahead < (trouble - p.x) * direction:
+                    trouble, pit = e.x + direction * TILE_SIZE, False
+        if trouble is None:
+            # stuck somewhere: now and then try getting up onto something
+            if self.backoffs and not self.back and self.rng.random() < EXPLORE_CHANCE:
+                x, y, outcome = predict(world, p.x, p.y, p.vx, -world_module.JUMP_SPEED, direction, MAX_HOLD, LAND_STEPS)
+                if outcome == 'landed' and y < p.y - TILE_SIZE / 2:
+                    # give the new way a chance: going on from up there is progress
+                    self.best_x = p.x
+                    self.stuck = 0
+                    return MAX_HOLD, direction
+            return 0, direction
+        # the jumps don't change while the player stands still
+        key = (int(p.x), int(p.vx), trouble)
+        if key != self.failed:
+            for hold in HOLDS:
+                x, y, outcome = predict(world, p.x, p.y, p.vx, -world_module.JUMP_SPEED, direction, hold, LAND_STEPS)
+                if outcome == 'finish' or outcome == 'landed' and (x - trouble) * direction > 0:
+                    # a little jitter in when the jump goes off
+                    return (hold if self.rng.random() < 0.8 else 0), direction
+            self.failed = key
+        # no jump gets past; don't run into a pit, and turn if backing off
+        if pit and (trouble - p.x) * direction < p.hw + TILE_SIZE:
+            self.back = 0
+            return 0, 0
+        return 0, direction
+
+    # direction to steer in the air: the one wanted if the player doesn't
+    # fall out of the map that way, else letting go or turning back
+    def choose_steer(self, world, direction):
+        p = world.player
+        for d in (direction, 0, -direction) if direction else (0, 1, -1):
+            x, y, outcome = predict(world, p.x, p.y, p.vx, p.vy, d, self.hold, LAND_STEPS)
+            if outcome != 'fell':
+                return d
+        return direction
+
+# (x of the near side, whether it is a pit) of the first wall, or drop the
+# player can't survive, in the SCAN_COLS columns ahead of it, or (None, False)
+def trouble_ahead(world, direction):
+    p = world.player
+    kind_at = world.kind_at
+    top = int((p.y - p.hh) // TILE_SIZE)
+    foot = int((p.y + p.hh + 2) // TILE_SIZE)
+    lead = int((p.x + direction * p.hw) // TILE_SIZE)
+    for c in range(lead + direction, lead + direction * (SCAN_COLS + 1), direction):
+        near = c * TILE_SIZE if direction > 0 else (c + 1) * TILE_SIZE
+        if any(kind_at(c, r) for r in range(top, foot)):
+            return near, False
+        if not kind_at(c, foot):
+            # a drop: see where running off it ends up
+            if predict(world, p.x, p.y, p.vx, 0.0, direction, 0, LAND_STEPS)[2] == 'fell':
+                return near, True
+            return None, False
+    return None, False
+
+POLICIES = {'idle': Idle, 'walker': Walker, 'explorer': Explorer}
+
+# --- ROLLOUTS ---
+def rollout(level_index, policy='explorer', seed=0, max_steps=MAX_STEPS, overrides=None):
+    # each worker process has its own copy of the world module, but runs
+    # many rollouts, so start every one from the defaults
+    constants = dict(DEFAULTS)
+    for name, value in (overrides or {}).items():
+        if name not in TUNABLE:
+            raise ValueError(f"{name} is not a tunable world constant")
+        constants[name] = value
+    for name, value in constants.items():
+        setattr(world_module, name, value)
+    from levels import levels
+    world = World(levels)
+    world.new_game(level_index)
+    bot = POLICIES[policy](random.Random(seed))
+    inputs = Inputs()
+    steps = 0
+    while steps < max_steps and world.state == "game" and world.current_level_index == level_index:
+        bot(steps, world, inputs)
+        world.step(SIM_DT, inputs)
+        steps += 1
+    completed = world.state == "won" or world.current_level_index != level_index
+    return {
+        'level': level_index,
+        'policy': policy,
+        'seed': seed,
+        'completed': completed,
+        'time': steps * SIM_DT,
+        'deaths': LIVES_START - world.player.lives,
+        'score': world.score,
+        'state': world.state,
+    }
+
+def _run(args):
+    return rollout(*args)
+
+# runs rollouts given as (level, policy, seed, max_steps, overrides) tuples
+def run_rollouts(jobs, workers=None):
+    with Pool(workers) as pool:
+        return pool.map(_run, jobs, chunksize=1)
+
+def aggregate(results):
+    by_level = {}
+    for r in results:
+        by_level.setdefault((r['level'], r['policy']), []).append(r)
+    stats = []
+    for (level, policy), runs in sorted(by_level.items()):
+        done = [r for r in runs if r['completed']]
+        stats.append({
+            'level': level,
+            'policy': policy,
+            'runs': len(runs),
+            'completion_rate': len(done) / len(runs),
+            'median_time': statistics.median(r['time'] for r in done) if done else None,
+            'best_time': min(r['time'] for r in done) if done else None,
+            'mean_deaths': statistics.mean(r['deaths'] for r in runs),
+            'mean_score': statistics.mean(r['score'] for r in runs),
+        })
+    return stats
+
+# whether a level can be finished at all; the last shipped one is a
+# closing screen with no finish tile
+def has_finish(level):
+    return any(b'f' in level.chunk(i) for i in range(-(-level.w // CHUNK_W)))
+
+def parse_levels(spec, count):
+    if not spec:
+        return list(range(count))
+    chosen = []
+    for part in spec.split(','):
+        first, _, last = part.partition('-')
+        chosen.extend(range(int(first) - 1, int(last or first)))
+    return chosen
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless bot rollouts over the levels")
+    parser.add_argument('--levels', help="levels to play, 1-based, e.g. 1-5,9 (default: all)")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='explorer')
+    parser.add_argument('--runs', type=int, default=4, help="rollouts per level, each with its own seed")
+    parser.add_argument('--max-steps', type=int, default=MAX_STEPS)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help="override a world constant")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--json', metavar='PATH', help="write the results and statistics to PATH")
+    parser.add_argument('--check', action='store_true',
+                        help="exit 1 unless every level with a finish was completed at least once")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        overrides[name] = float(value)
+    from levels import levels
+    jobs = [(level, args.policy, seed, args.max_steps, overrides)
+            for level in parse_levels(args.levels, len(levels)) for seed in range(args.runs)]
+    results = run_rollouts(jobs, args.workers)
+    stats = aggregate(results)
+
+    for s in stats:
+        time = f"{s['median_time']:6.1f} s" if s['median_time'] is not None else "     - "
+        print(f"level {s['level'] + 1:2d}  {s['policy']:8s}  completed {s['completion_rate']:4.0%}  "
+              f"median {time}  deaths {s['mean_deaths']:5.1f}  score {s['mean_score']:6.0f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'overrides': overrides, 'stats': stats, 'results': results}, f, indent=1)
+    if args.check:
+        unfinishable = [s['level'] + 1 for s in stats if not has_finish(levels[s['level']])]
+        if unfinishable:
+            print(f"no finish, not checked: levels {', '.join(map(str, unfinishable))}")
+        failed = [s['level'] + 1 for s in stats if not s['completion_rate'] and s['level'] + 1 not in unfinishable]
+        if failed:
+            print(f"never completed: levels {', '.join(map(str, failed))}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()